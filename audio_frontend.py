@@ -0,0 +1,320 @@
+"""
+Shared audio preprocessing.
+
+Every file is decoded once to 16 kHz mono float32. The same buffer then
+feeds AASIST and RawNet.
+
+Resampling calls soxr (a polyphase resampler, the one librosa uses by
+default) directly, on float32, so neither librosa nor a float64 copy is
+needed on the scoring path.
+
+When only the start of a file is scored, only that part is decoded, so
+memory stays flat however long the file is: plain PCM WAV is read
+through a memory map, other formats block by block.
+"""
+
+import os
+import struct
+from typing import List
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+SAMPLE_RATE = 16000
+NB_SAMP = 64600
+
+# quality -> soxr preset; "high" matches librosa.resample's default (soxr_hq)
+RESAMPLE_QUALITIES = {"fast": "LQ", "high": "HQ", "best": "VHQ"}
+RESAMPLE_QUALITY = "high"
+
+
+def pad(x, max_len=NB_SAMP):
+    x_len = x.shape[0]
+    if x_len == 0:
+        raise ValueError("no audio samples to pad")
+    if x_len >= max_len:
+        return x[:max_len]
+    # need to pad
+    num_repeats = int(max_len / x_len) + 1
+    padded_x = np.tile(x, (1, num_repeats))[:, :max_len][0]
+    return padded_x
+
+
+# WAVE format tags read through a memory map: tag -> {bits per sample: (dtype, offset, scale)},
+# with the same scaling libsndfile applies
+_WAV_PCM = 0x0001
+_WAV_FLOAT = 0x0003
+_WAV_EXTENSIBLE = 0xFFFE
+_WAV_DTYPES = {
+    _WAV_PCM: {8: ("u1", -128.0, 1 / 128), 16: ("<i2", 0.0, 1 / 2**15), 32: ("<i4", 0.0, 1 / 2**31)},
+    _WAV_FLOAT: {32: ("<f4", 0.0, 1.0), 64: ("<f8", 0.0, 1.0)},
+}
+# frames decoded per block for compressed formats
+DECODE_BLOCK = 64 * 1024
+# extra source audio decoded past a partial read, so the resampler's
+# filter sees the same samples as with the whole file
+RESAMPLE_MARGIN = 0.05
+
+
+def _wav_layout(audio_path: str):
+    """
+    (data offset, frames, channels, sample rate, dtype, offset, scale) of
+    a plain PCM / float WAV file, None for anything else
+    """
+    with open(audio_path, "rb") as f_wav:
+        header = f_wav.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f_wav.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+            if chunk_id == b"fmt ":
+                fmt = f_wav.read(size)
+                if size % 2:
+                    f_wav.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                data_offset = f_wav.tell()
+                break
+            else:
+                f_wav.seek(size + size % 2, os.SEEK_CUR)
+        if fmt is None or len(fmt) < 16:
+            return None
+        size = min(size, os.fstat(f_wav.fileno()).st_size - data_offset)
+
+    tag, channels, fs, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == _WAV_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]
+    layout = _WAV_DTYPES.get(tag, {}).get(bits)
+    if layout is None or channels == 0 or block_align != channels * bits // 8:
+        return None
+    return (data_offset, size // block_align, channels, fs) + layout
+
+
+def _downmix(frames):
+    """Mean of the channels of a (#frames, #channels) array, as float32"""
+    # channel by channel: mean(axis=1) over a few channels is several times slower
+    X = frames[:, 0].astype(np.float32)
+    for channel in range(1, frames.shape[1]):
+        X += frames[:, channel]
+    if frames.shape[1] > 1:
+        X /= frames.shape[1]
+    return X
+
+
+def _decode_wav(audio_path: str, layout, frames: int = None):
+    """Mono float32 from a memory-mapped WAV, copied out of the map"""
+    data_offset, nb_frames, channels, fs, dtype, offset, scale = layout
+    if frames is not None:
+        nb_frames = min(nb_frames, frames)
+    if nb_frames == 0:
+        return np.zeros(0, dtype=np.float32), fs
+    data = np.memmap(audio_path, dtype=dtype, mode="r", offset=data_offset,
+                     shape=(nb_frames, channels))
+    if channels == 1 and data.dtype == np.float32:
+        # a view would outlive the map: truncating the file then crashes the reader
+        return np.array(data[:, 0]), fs
+    X = _downmix(data)
+    if offset:
+        X += offset
+    if scale != 1.0:
+        X *= scale
+    return X, fs
+
+
+def _decode_blocks(audio_path: str, frames: int = None):
+    """
+    Decodes up to `frames` frames block by block, downmixing as it goes.
+    returns (waveform, sample rate, frames in the file or None if unknown)
+    """
+    with sf.SoundFile(audio_path) as f_audio:
+        fs = f_audio.samplerate
+        total = f_audio.frames if f_audio.frames > 0 else None
+        if frames is None:
+            frames = total
+        elif total is not None:
+            frames = min(frames, total)
+
+        blocks = []
+        nb_read = 0
+        while frames is None or nb_read < frames:
+            count = DECODE_BLOCK if frames is None else min(DECODE_BLOCK, frames - nb_read)
+            block = f_audio.read(count, dtype="float32", always_2d=True)
+            if block.shape[0] == 0:
+                # read to the end: the length is known now
+                total = nb_read
+                break
+            blocks.append(_downmix(block))
+            nb_read += block.shape[0]
+    if not blocks:
+        return np.zeros(0, dtype=np.float32), fs, total
+    return (blocks[0] if len(blocks) == 1 else np.concatenate(blocks)), fs, total
+
+
+def iter_audio_blocks(audio_path: str):
+    """
+    Streams a whole file at its own sample rate as mono float32 blocks of
+    up to DECODE_BLOCK frames, decoded one at a time: PCM WAV through a
+    memory map, other formats with libsndfile.
+
+    returns (sample rate, frames, iterator over the blocks), or None when
+    the file cannot be streamed (length not in the header, or a format
+    libsndfile cannot read); decode_audio reads those
+    """
+    layout = _wav_layout(audio_path)
+    if layout is not None:
+        data_offset, nb_frames, channels, fs, dtype, offset, scale = layout
+
+        def wav_blocks():
+            if nb_frames == 0:
+                return
+            data = np.memmap(audio_path, dtype=dtype, mode="r", offset=data_offset,
+                             shape=(nb_frames, channels))
+            for start in range(0, nb_frames, DECODE_BLOCK):
+                # _downmix copies, so no block is a view of the map
+                X = _downmix(data[start:start + DECODE_BLOCK])
+                if offset:
+                    X += offset
+                if scale != 1.0:
+                    X *= scale
+                yield X
+        return fs, nb_frames, wav_blocks()
+
+    try:
+        info = sf.info(audio_path)
+    except (RuntimeError, sf.LibsndfileError):
+        return None
+    if info.frames <= 0:
+        return None
+
+    def sf_blocks():
+        with sf.SoundFile(audio_path) as f_audio:
+            while True:
+                block = f_audio.read(DECODE_BLOCK, dtype="float32", always_2d=True)
+                if block.shape[0] == 0:
+                    return
+                yield _downmix(block)
+    return info.samplerate, info.frames, sf_blocks()
+
+
+def _decode(audio_path: str, duration: float = None):
+    """decode_audio, plus the length of the whole file in seconds (None if unknown)"""
+    layout = _wav_layout(audio_path)
+    if layout is not None:
+        frames = None if duration is None else int(np.ceil(duration * layout[3]))
+        X, fs = _decode_wav(audio_path, layout, frames)
+        return X, fs, layout[1] / fs
+
+    try:
+        if duration is None:
+            X, fs, total = _decode_blocks(audio_path)
+        else:
+            fs = sf.info(audio_path).samplerate
+            X, fs, total = _decode_blocks(audio_path, int(np.ceil(duration * fs)))
+        return X, fs, None if total is None else total / fs
+    except (RuntimeError, sf.LibsndfileError):
+        import librosa
+        X, fs = librosa.load(audio_path, sr=None, mono=True, duration=duration)
+
+    if duration is None or X.shape[0] < duration * fs:
+        return X, fs, X.shape[0] / fs
+    return X, fs, audio_duration(audio_path)
+
+
+def decoded_bytes(audio_path: str, max_samples: int = None, sr: int = SAMPLE_RATE):
+    """
+    Length of the start of a file that load_audio(audio_path, sr,
+    max_samples=max_samples) reads: the header and the decoded frames of
+    a plain PCM / float WAV. None when the whole file is read (no
+    max_samples, or another format, whose block decoder reads ahead).
+    """
+    if max_samples is None:
+        return None
+    layout = _wav_layout(audio_path)
+    if layout is None:
+        return None
+    data_offset, nb_frames, channels, fs, dtype = layout[:5]
+    frames = min(nb_frames, int(np.ceil((max_samples / sr + RESAMPLE_MARGIN) * fs)))
+    return data_offset + frames * channels * np.dtype(dtype).itemsize
+
+
+def decode_audio(audio_path: str, duration: float = None):
+    """
+    Decodes a file to a mono float32 waveform at its own sample rate.
+
+    duration : seconds to decode from the start, None for the whole file.
+               Only that part is read: PCM WAV through a memory map,
+               other formats block by block.
+
+    Falls back to librosa for formats libsndfile cannot read.
+    returns (waveform, sample rate)
+    """
+    return _decode(audio_path, duration)[:2]
+
+
+def audio_duration(audio_path: str):
+    """Length of a file in seconds, from its header; None when unknown"""
+    try:
+        info = sf.info(audio_path)
+        if info.frames > 0:
+            return info.frames / info.samplerate
+    except (RuntimeError, sf.LibsndfileError):
+        pass
+    try:
+        import librosa
+        return float(librosa.get_duration(path=audio_path))
+    except Exception:
+        return None
+
+
+def resample(X: np.ndarray, fs: int, sr: int = SAMPLE_RATE,
+             quality: str = None) -> np.ndarray:
+    """
+    Resamples a mono waveform from fs to sr, returns contiguous float32.
+    quality : "fast", "high" or "best" (RESAMPLE_QUALITY when None)
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    if fs != sr and X.shape[0] > 0:
+        X = soxr.resample(X, fs, sr, quality=RESAMPLE_QUALITIES[quality or RESAMPLE_QUALITY])
+
+    return X
+
+
+def load_audio(audio_path: str, sr: int = SAMPLE_RATE, quality: str = None,
+               max_samples: int = None, with_duration: bool = False):
+    """
+    Decodes a file to a mono float32 waveform at `sr`.
+    max_samples   : keep only the first max_samples samples (at `sr`), and
+                    decode just the part of the file they come from
+    with_duration : also return the length of the whole file in seconds
+                    (None if unknown), as (waveform, duration)
+    """
+    if max_samples is None:
+        X, fs, seconds = _decode(audio_path)
+        X = resample(X, fs, sr, quality)
+    else:
+        X, fs, seconds = _decode(audio_path, max_samples / sr + RESAMPLE_MARGIN)
+        X = resample(X, fs, sr, quality)[:max_samples]
+    return (X, seconds) if with_duration else X
+
+
+def prepare_input(waveform: np.ndarray, nb_samp: int = NB_SAMP) -> np.ndarray:
+    """
+    Pads/truncates a decoded waveform to the model input length.
+    Raises ValueError for an empty waveform.
+    """
+    return pad(waveform, nb_samp)
+
+
+def load_batch(audio_paths: List[str], nb_samp: int = NB_SAMP,
+               quality: str = None) -> np.ndarray:
+    """
+    Decodes and pads several files into one (#files, nb_samp) array
+    quality : resampling quality, see resample
+    """
+    return np.stack([prepare_input(load_audio(path, quality=quality, max_samples=nb_samp),
+                                   nb_samp)
+                     for path in audio_paths])
@@ -0,0 +1,220 @@
+"""
+Spectrogram and waveform previews of an audio file.
+
+A preview is reduced to the resolution it is shown at before anything is
+drawn: the waveform to one min/max pair per pixel column, the mel
+spectrogram to one STFT frame per column. Drawing is then one filled
+polygon and one image, however long the file is. Files are reduced in
+one pass over their decoded blocks, so memory does not grow with their
+length either. Previews are kept in an LRU cache keyed by path, size and
+mtime, so going back to a file is instant.
+
+Kept free of Qt so the same drawing code runs in the GUI and in the
+benchmarks (on a plain matplotlib figure).
+"""
+
+import functools
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+
+from audio_frontend import decode_audio, iter_audio_blocks
+
+N_MELS = 128
+N_FFT = 2048
+# finest spectrogram hop, so short clips are not oversampled
+MIN_HOP = 512
+# dynamic range shown, as librosa.power_to_db
+TOP_DB = 80.0
+
+
+class Preview(NamedTuple):
+    duration: float         # seconds
+    sample_rate: int
+    envelope: np.ndarray    # (2, columns) min and max of each column
+    mel_db: np.ndarray      # (N_MELS, frames) power in dB relative to the peak
+
+
+def waveform_envelope(audio_data, columns):
+    """Min and max of `columns` equal slices of the waveform, as (2, columns)"""
+    if audio_data.shape[0] == 0:
+        return np.zeros((2, 1), dtype=np.float32)
+    columns = max(1, min(columns, audio_data.shape[0]))
+    starts = (np.arange(columns) * audio_data.shape[0]) // columns
+    return np.stack((np.minimum.reduceat(audio_data, starts),
+                     np.maximum.reduceat(audio_data, starts)))
+
+
+@functools.lru_cache(maxsize=1)
+def _hann(n):
+    return (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def _mel_basis(sample_rate):
+    import librosa
+    return librosa.filters.mel(sr=sample_rate, n_fft=N_FFT, n_mels=N_MELS).astype(np.float32)
+
+
+def _frame_starts(nb_samples, columns):
+    """First sample of each centred STFT frame, about one frame per column"""
+    hop = max(MIN_HOP, -(-nb_samples // max(columns, 1)))
+    nb_frames = 1 + nb_samples // hop
+    return np.arange(nb_frames) * hop - N_FFT // 2
+
+
+def _frames_to_mel_db(frames, sample_rate):
+    """Mel power in dB of (#frames, N_FFT) samples, as (N_MELS, #frames)"""
+    frames = frames.astype(np.float32) * _hann(N_FFT)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    S = _mel_basis(sample_rate) @ power.T.astype(np.float32)
+    S_dB = 10 * np.log10(np.maximum(S, 1e-10) / max(S.max(), 1e-10))
+    return np.maximum(S_dB, -TOP_DB)
+
+
+def mel_spectrogram_db(audio_data, sample_rate, columns):
+    """
+    Mel power spectrogram in dB with about one frame per display column.
+    Only the N_FFT samples around each frame centre are read, so the cost
+    does not grow with the file length.
+    """
+    if audio_data.shape[0] == 0:
+        return np.full((N_MELS, 1), -TOP_DB, dtype=np.float32)
+    # centred frames; samples past either end count as silence
+    idx = _frame_starts(audio_data.shape[0], columns)[:, None] + np.arange(N_FFT)
+    inside = (idx >= 0) & (idx < audio_data.shape[0])
+    frames = np.where(inside, audio_data[np.clip(idx, 0, audio_data.shape[0] - 1)], 0)
+    return _frames_to_mel_db(frames, sample_rate)
+
+
+def make_preview(audio_data, sample_rate, columns):
+    """Preview of a decoded mono waveform for a canvas `columns` pixels wide"""
+    return Preview(duration=audio_data.shape[0] / sample_rate,
+                   sample_rate=sample_rate,
+                   envelope=waveform_envelope(audio_data, columns),
+                   mel_db=mel_spectrogram_db(audio_data, sample_rate, columns))
+
+
+def _stream_preview(blocks, nb_samples, sample_rate, columns):
+    """
+    make_preview of a waveform given as consecutive blocks: the envelope
+    is a running min/max per column and each spectrogram frame keeps only
+    its N_FFT samples, so no more than one block is held at a time
+    """
+    nb_columns = max(1, min(columns, nb_samples))
+    column_starts = (np.arange(nb_columns) * nb_samples) // nb_columns
+    lows = np.full(nb_columns, np.inf, dtype=np.float32)
+    highs = np.full(nb_columns, -np.inf, dtype=np.float32)
+    frame_starts = _frame_starts(nb_samples, columns)
+    # samples past either end count as silence
+    frames = np.zeros((frame_starts.shape[0], N_FFT), dtype=np.float32)
+
+    pos = 0
+    for block in blocks:
+        # the header may overstate or understate the length
+        block = block[:nb_samples - pos]
+        if block.shape[0] == 0:
+            break
+        end = pos + block.shape[0]
+
+        first = np.searchsorted(column_starts, pos, side="right") - 1
+        last = np.searchsorted(column_starts, end - 1, side="right")
+        bounds = np.concatenate(([0], column_starts[first + 1:last] - pos))
+        lows[first:last] = np.minimum(lows[first:last], np.minimum.reduceat(block, bounds))
+        highs[first:last] = np.maximum(highs[first:last], np.maximum.reduceat(block, bounds))
+
+        for k in range(np.searchsorted(frame_starts + N_FFT, pos, side="right"),
+                       np.searchsorted(frame_starts, end)):
+            start = frame_starts[k]
+            lo, hi = max(start, pos), min(start + N_FFT, end)
+            frames[k, lo - start:hi - start] = block[lo - pos:hi - pos]
+        pos = end
+
+    # columns the file fell short of
+    lows[np.isinf(lows)] = 0
+    highs[np.isinf(highs)] = 0
+    return Preview(duration=nb_samples / sample_rate,
+                   sample_rate=sample_rate,
+                   envelope=np.stack((lows, highs)),
+                   mel_db=_frames_to_mel_db(frames, sample_rate))
+
+
+def load_preview(audio_path, columns):
+    """
+    Decodes a file at its own sample rate and reduces it to a preview
+    block by block; files whose length is not known up front are decoded
+    whole
+    """
+    stream = iter_audio_blocks(audio_path)
+    if stream is None or stream[1] == 0:
+        audio_data, sample_rate = decode_audio(audio_path)
+        return make_preview(audio_data, sample_rate, columns)
+    sample_rate, nb_samples, blocks = stream
+    return _stream_preview(blocks, nb_samples, sample_rate, columns)
+
+
+class PreviewCache:
+    """
+    Last `maxsize` previews, keyed by (path, size, mtime, columns), so an
+    edited file is decoded again. Safe to share between threads.
+    """
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._previews = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, audio_path, columns):
+        st = os.stat(audio_path)
+        key = (os.path.abspath(audio_path), st.st_size, st.st_mtime_ns, columns)
+        with self._lock:
+            preview = self._previews.get(key)
+            if preview is not None:
+                self._previews.move_to_end(key)
+                return preview
+
+        preview = load_preview(audio_path, columns)
+        with self._lock:
+            self._previews[key] = preview
+            while len(self._previews) > self.maxsize:
+                self._previews.popitem(last=False)
+        return preview
+
+    def clear(self):
+        with self._lock:
+            self._previews.clear()
+
+
+def _mel_ticks(sample_rate, n_mels=N_MELS):
+    """y positions (in mel bands) and labels of round frequencies"""
+    import librosa
+
+    fmax = sample_rate / 2
+    top = librosa.hz_to_mel(fmax)
+    freqs = [f for f in (0, 500, 1000, 2000, 4000, 8000, 16000) if f <= fmax]
+    positions = [n_mels * librosa.hz_to_mel(f) / top for f in freqs]
+    labels = ['{:g}k'.format(f / 1000) if f >= 1000 else str(f) for f in freqs]
+    return positions, labels
+
+
+def draw_mel_spectrogram(ax, preview):
+    ax.clear()
+    ax.imshow(preview.mel_db, origin='lower', aspect='auto', cmap='viridis',
+              interpolation='nearest', extent=(0, preview.duration, 0, preview.mel_db.shape[0]))
+    positions, labels = _mel_ticks(preview.sample_rate, preview.mel_db.shape[0])
+    ax.set_yticks(positions, labels)
+    ax.set_ylabel('Hz')
+    ax.set_xlabel('Time (s)')
+    ax.set_title('Mel-Spectrogram')
+
+
+def draw_waveform(ax, preview):
+    ax.clear()
+    columns = preview.envelope.shape[1]
+    times = (np.arange(columns) + 0.5) * preview.duration / columns
+    ax.fill_between(times, preview.envelope[0], preview.envelope[1], linewidth=0.5)
+    ax.set_xlim(0, preview.duration)
+    ax.set_xlabel('Time (s)')
+    ax.set_title("Waveform")
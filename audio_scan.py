@@ -0,0 +1,73 @@
+"""
+Lazy directory scanner for audio files.
+
+Walks a tree with os.scandir and yields each audio file as soon as its
+directory is read, so scoring starts before the enumeration finishes.
+Extensions are matched case-insensitively (.WAV, .Flac, ...). Include and
+exclude patterns are fnmatch globs, matched case-insensitively against
+the path relative to the root, the same with a leading "/" (and a
+trailing one for folders), and the bare name, so "*/backup/*" also
+skips a backup folder right under the root.
+"""
+
+import fnmatch
+import os
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac')
+
+
+def _matches(rel_path, name, patterns, is_dir=False):
+    rel_path = rel_path.replace(os.sep, '/').lower()
+    paths = [rel_path, '/' + rel_path] + (['/' + rel_path + '/'] if is_dir else [])
+    paths.append(name.lower())
+    return any(fnmatch.fnmatchcase(path, pattern) for pattern in patterns for path in paths)
+
+
+def scan_audio(root, recursive=True, max_depth=None, include=None, exclude=None,
+               extensions=AUDIO_EXTENSIONS, follow_symlinks=False):
+    """
+    Yields audio file paths under root, depth first: the files of a folder in
+    directory order, then its sub-folders in name order.
+
+    recursive       : descend into sub-folders
+    max_depth       : sub-folder levels to descend (0 = root only), None = no limit
+    include         : patterns a file must match (any of them), None = all files
+    exclude         : patterns of files and folders to skip
+    follow_symlinks : descend into symlinked folders (loops are not detected)
+
+    Unreadable folders are skipped (a folder that fails part way keeps the
+    files already yielded).
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    include = [pattern.lower() for pattern in include or ()]
+    exclude = [pattern.lower() for pattern in exclude or ()]
+    if not recursive:
+        max_depth = 0
+
+    # (folder, path relative to root, depth); popped last in, so reversed below
+    stack = [(root, '', 0)]
+    while stack:
+        folder, rel_folder, depth = stack.pop()
+        sub_folders = []
+        try:
+            with os.scandir(folder) as it:
+                # files are yielded as the listing is read, however large the folder
+                for entry in it:
+                    rel_path = os.path.join(rel_folder, entry.name)
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+                    except OSError:
+                        continue
+                    if exclude and _matches(rel_path, entry.name, exclude, is_dir):
+                        continue
+                    if is_dir:
+                        if max_depth is None or depth < max_depth:
+                            sub_folders.append((entry.path, rel_path, depth + 1))
+                    elif entry.name.lower().endswith(extensions):
+                        if not include or _matches(rel_path, entry.name, include):
+                            yield entry.path
+        except OSError:
+            pass
+        # only the sub-folders are sorted, so the walk order stays stable
+        sub_folders.sort(key=lambda sub_folder: sub_folder[1])
+        stack.extend(reversed(sub_folders))
@@ -0,0 +1,66 @@
+"""
+Direct vs FFT convolution for the sinc front ends.
+
+Times F.conv1d against models.fft_conv.FFTConv1d over a sweep of kernel
+lengths and reports the crossover kernel length, i.e. the smallest kernel
+from which the FFT path is faster.
+
+    python -m benchmarks.fft_conv --channels 20 70 --batch 1 8
+"""
+
+import argparse
+import time
+
+import torch
+import torch.nn.functional as F
+
+from models.fft_conv import FFT_KERNEL_THRESHOLD, FFTConv1d
+
+
+def _time(fn, repeats):
+    fn()  # warm-up (and filter spectrum cache)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--nb-samp', type=int, default=64600)
+    parser.add_argument('--channels', type=int, nargs='+', default=[20, 70])
+    parser.add_argument('--kernels', type=int, nargs='+',
+                        default=[33, 65, 129, 257, 513, 1025])
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print('torch threads: {}, current threshold: {}'.format(
+        torch.get_num_threads(), FFT_KERNEL_THRESHOLD))
+    print('{:>8} {:>8} {:>6} {:>12} {:>12} {:>10}'.format(
+        'channels', 'kernel', 'batch', 'direct (ms)', 'fft (ms)', 'max err'))
+
+    for channels in args.channels:
+        for batch in args.batch:
+            x = torch.randn(batch, 1, args.nb_samp)
+            crossover = None
+            for kernel in args.kernels:
+                filters = torch.randn(channels, 1, kernel) / kernel
+                fft_conv = FFTConv1d()
+                with torch.no_grad():
+                    direct_t = _time(lambda: F.conv1d(x, filters), args.repeats)
+                    fft_t = _time(lambda: fft_conv(x, filters), args.repeats)
+                    err = (F.conv1d(x, filters) - fft_conv(x, filters)).abs().max().item()
+                print('{:>8} {:>8} {:>6} {:>12.2f} {:>12.2f} {:>10.1e}'.format(
+                    channels, kernel, batch, direct_t * 1e3, fft_t * 1e3, err))
+                if crossover is None and fft_t < direct_t:
+                    crossover = kernel
+            print('crossover (channels={}, batch={}): {}'.format(
+                channels, batch, crossover if crossover else 'none in sweep'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Chunked vs full graph attention in AASIST.
+
+Runs the pretrained AASIST on random input with the full pairwise node
+tensor and with several chunk sizes. Reports the largest output difference,
+the time per batch and the size of the biggest pairwise tensor the
+attention layers build. On CUDA the measured peak memory is reported too.
+
+    python -m benchmarks.gat_chunking --batch 64 --chunks 4 8 16
+"""
+
+import argparse
+import json
+import time
+
+import torch
+
+from main_aasist import get_model
+from models.AASIST import GraphAttentionLayer, HtrgGraphAttentionLayer
+
+
+def _pairwise_peak_bytes(model, batch, nb_samp, device):
+    """Largest (#bs, #rows, #node, #dim) tensor built by the attention layers"""
+    peak = [0]
+
+    def hook(module, inputs, output):
+        nb_nodes = sum(t.size(1) for t in inputs if torch.is_tensor(t) and t.dim() == 3)
+        rows = module.att_chunk_size or nb_nodes
+        dim = max(module.att_proj.in_features, module.att_proj.out_features)
+        peak[0] = max(peak[0], batch * min(rows, nb_nodes) * nb_nodes * dim * 4)
+
+    handles = [m.register_forward_hook(hook) for m in model.modules()
+               if isinstance(m, (GraphAttentionLayer, HtrgGraphAttentionLayer))]
+    with torch.no_grad():
+        model(torch.zeros(batch, nb_samp, device=device))
+    for handle in handles:
+        handle.remove()
+    return peak[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--config', default='config/AASIST.conf')
+    parser.add_argument('--batch', type=int, default=16)
+    parser.add_argument('--nb-samp', type=int, default=64600)
+    parser.add_argument('--chunks', type=int, nargs='+', default=[2, 4, 8, 16])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f_json:
+        config = json.loads(f_json.read())
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    model = get_model(config['model_config'], device)
+    model.load_state_dict(torch.load(config['model_path'], map_location=device))
+    model.eval()
+
+    x = torch.randn(args.batch, args.nb_samp, device=device) * 0.1
+    print('{:>8} {:>12} {:>16} {:>14} {:>12}'.format(
+        'chunk', 'time (ms)', 'pairwise (MB)', 'cuda peak (MB)', 'max diff'))
+
+    reference = None
+    for chunk in [None] + args.chunks:
+        model.set_gat_chunk_size(chunk)
+        pairwise = _pairwise_peak_bytes(model, args.batch, args.nb_samp, device)
+        if device == 'cuda':
+            torch.cuda.reset_peak_memory_stats()
+        with torch.no_grad():
+            out = model(x)[1]
+            start = time.perf_counter()
+            for _ in range(args.repeats):
+                model(x)
+            elapsed = (time.perf_counter() - start) / args.repeats
+        if reference is None:
+            reference = out
+        cuda_peak = torch.cuda.max_memory_allocated() / 2**20 if device == 'cuda' else float('nan')
+        print('{:>8} {:>12.1f} {:>16.1f} {:>14.1f} {:>12.1e}'.format(
+            'full' if chunk is None else chunk, elapsed * 1e3, pairwise / 2**20,
+            cuda_peak, (out - reference).abs().max().item()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Score drift and speed of the dynamic int8 models against fp32.
+
+Builds each model twice on CPU, once as configured in fp32 and once with
+"quantize": "dynamic", scores every file in the audio folder with both and
+reports the per-file spoof probabilities, the largest and mean drift, the
+number of flipped decisions, the time per batch and the state dict size.
+
+    python -m benchmarks.quantization --models RawNet AASIST --audio sample_audio
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import time
+
+import torch
+
+import main_aasist
+import main_rawnet
+from audio_frontend import NB_SAMP, load_audio, prepare_input
+from models.quantization import state_dict_bytes
+
+BUILDERS = {
+    "AASIST": (main_aasist.CONFIG_FILE, main_aasist.build_model, main_aasist.predict),
+    "RawNet": (main_rawnet.CONFIG_FILE, main_rawnet.build_model, main_rawnet.predict),
+}
+
+
+def _load_inputs(audio_dir):
+    paths = sorted(p for p in glob.glob(os.path.join(audio_dir, '*'))
+                   if p.lower().endswith(('.wav', '.flac', '.mp3', '.ogg')))
+    x = torch.stack([torch.from_numpy(prepare_input(load_audio(p), NB_SAMP)) for p in paths])
+    return paths, x
+
+
+def _time(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--models', nargs='+', default=['RawNet', 'AASIST'],
+                        choices=sorted(BUILDERS))
+    parser.add_argument('--audio', default='sample_audio')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    paths, x = _load_inputs(args.audio)
+    print('torch threads: {}, files: {}'.format(torch.get_num_threads(), len(paths)))
+
+    for name in args.models:
+        config_file, build_model, predict = BUILDERS[name]
+        with open(config_file, 'r') as f_json:
+            config = json.loads(f_json.read())
+
+        results = {}
+        for mode in (None, 'dynamic'):
+            mode_config = copy.deepcopy(config)
+            mode_config['quantize'] = mode
+            model = build_model(mode_config, 'cpu')
+            probs, classes = predict(model, x)
+            elapsed = _time(lambda: predict(model, x), args.repeats)
+            results[mode] = (probs, classes, elapsed, state_dict_bytes(model))
+
+        fp_probs, fp_classes, fp_time, fp_size = results[None]
+        q_probs, q_classes, q_time, q_size = results['dynamic']
+        drift = (q_probs - fp_probs).abs()
+
+        print('\n{}'.format(name))
+        print('{:<24} {:>10} {:>10} {:>10}'.format('file', 'fp32', 'int8', 'drift'))
+        for path, fp, q, d in zip(paths, fp_probs.tolist(), q_probs.tolist(), drift.tolist()):
+            print('{:<24} {:>10.6f} {:>10.6f} {:>10.1e}'.format(os.path.basename(path), fp, q, d))
+        print('max drift {:.1e}, mean drift {:.1e}, flipped decisions {}/{}'.format(
+            drift.max().item(), drift.mean().item(),
+            int((q_classes != fp_classes).sum()), len(paths)))
+        print('batch of {}: fp32 {:.1f} ms, int8 {:.1f} ms ({:.2f}x)'.format(
+            len(paths), fp_time * 1e3, q_time * 1e3, fp_time / q_time))
+        print('state dict: fp32 {:.1f} MB, int8 {:.1f} MB ({:.2f}x)'.format(
+            fp_size / 2**20, q_size / 2**20, fp_size / q_size))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Per-stage latency and throughput of the scoring pipeline.
+
+Times each stage on its own: file decode, resample to 16 kHz, pad, the
+AASIST / AASIST-L / RawNet forward passes and the GUI spectrogram +
+waveform render. The I/O stages run on sample_audio/ and on synthetic
+clips of the given lengths (written as WAV at --synthetic-rate, so the
+resampler is exercised). Forward passes sweep batch sizes and torch
+thread counts. Each measurement reports p50/p95/p99 and files/sec.
+
+Results are written as JSON. Given a baseline JSON from an earlier run,
+every measurement whose p50 got slower by more than --tolerance is
+flagged, and the exit status is 1.
+
+    python -m benchmarks.suite --out bench.json
+    python -m benchmarks.suite --baseline bench.json --tolerance 0.1
+"""
+
+import argparse
+import copy
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+import torch
+
+import main_aasist
+import main_rawnet
+from audio_frontend import NB_SAMP, SAMPLE_RATE, decode_audio, prepare_input, resample
+
+STAGES = ("decode", "resample", "pad", "forward", "render")
+MODELS = {
+    "AASIST": ("config/AASIST.conf", main_aasist.build_model, main_aasist.predict),
+    "AASIST-L": ("config/AASIST-L.conf", main_aasist.build_model, main_aasist.predict),
+    "RawNet": (main_rawnet.CONFIG_FILE, main_rawnet.build_model, main_rawnet.predict),
+}
+
+
+def summarize(samples, items=1):
+    """Latency percentiles (ms) of a list of durations (s), and items per second"""
+    samples = np.asarray(samples)
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "n": int(samples.size),
+        "mean_ms": float(samples.mean() * 1e3),
+        "p50_ms": float(p50 * 1e3),
+        "p95_ms": float(p95 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "files_per_sec": float(items / p50) if p50 > 0 else float("inf"),
+    }
+
+
+def measure(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def make_synthetic(folder, seconds, rate):
+    """Writes a noise + tone clip and returns its path"""
+    rng = np.random.default_rng(1234)
+    t = np.arange(int(seconds * rate)) / rate
+    x = 0.1 * np.sin(2 * np.pi * 220 * t) + 0.02 * rng.standard_normal(t.size)
+    path = os.path.join(folder, "synthetic_{:g}s_{}Hz.wav".format(seconds, rate))
+    sf.write(path, x.astype(np.float32), rate)
+    return path
+
+
+def bench_io(datasets, stages, repeats, warmup):
+    """decode / resample / pad / render per dataset; samples are per file"""
+    results = {}
+    figure = axes = None
+    if "render" in stages:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from audio_preview import draw_mel_spectrogram, draw_waveform, make_preview
+        figure, axes = plt.subplots(2, 1)
+        columns = int(figure.get_figwidth() * figure.dpi)
+
+    for dataset, paths in datasets.items():
+        decoded = [decode_audio(path) for path in paths]
+        waveforms = [resample(X, fs) for X, fs in decoded]
+        samples = {stage: [] for stage in stages if stage != "forward"}
+        for path, (X, fs), waveform in zip(paths, decoded, waveforms):
+            if "decode" in samples:
+                samples["decode"] += measure(lambda: decode_audio(path), repeats, warmup)
+            if "resample" in samples and fs != SAMPLE_RATE:
+                samples["resample"] += measure(lambda: resample(X, fs), repeats, warmup)
+            if "pad" in samples:
+                samples["pad"] += measure(lambda: prepare_input(waveform, NB_SAMP), repeats, warmup)
+            if "render" in samples:
+                def render():
+                    preview = make_preview(X, fs, columns)
+                    draw_mel_spectrogram(axes[0], preview)
+                    draw_waveform(axes[1], preview)
+                    figure.canvas.draw()
+                samples["render"] += measure(render, max(1, repeats // 5), min(warmup, 1))
+        for stage, stage_samples in samples.items():
+            if stage_samples:
+                results["{}|{}".format(stage, dataset)] = summarize(stage_samples)
+    return results
+
+
+def bench_forward(models, batch_sizes, threads, repeats, warmup):
+    """Forward passes on random (#bs, nb_samp) input; files/sec counts the batch"""
+    results = {}
+    default_threads = torch.get_num_threads()
+    for name in models:
+        config_file, build_model, predict = MODELS[name]
+        with open(config_file, "r") as f_json:
+            config = json.loads(f_json.read())
+        model = build_model(copy.deepcopy(config), "cpu")
+        nb_samp = config["model_config"]["nb_samp"]
+        for nb_threads in threads:
+            torch.set_num_threads(nb_threads)
+            for batch_size in batch_sizes:
+                x = torch.randn(batch_size, nb_samp) * 0.1
+                samples = measure(lambda: predict(model, x), repeats, warmup)
+                key = "forward|{}|bs={}|threads={}".format(name, batch_size, nb_threads)
+                results[key] = summarize(samples, batch_size)
+    torch.set_num_threads(default_threads)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns {key: p50 ratio} for measurements slower than the baseline by > tolerance"""
+    regressions = {}
+    for key, stats in results.items():
+        base = baseline.get(key)
+        if base is None or base["p50_ms"] <= 0:
+            continue
+        ratio = stats["p50_ms"] / base["p50_ms"]
+        if ratio > 1 + tolerance:
+            regressions[key] = ratio
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--audio', default='sample_audio')
+    parser.add_argument('--synthetic', type=float, nargs='*', default=[4, 30],
+                        help='synthetic clip lengths in seconds')
+    parser.add_argument('--synthetic-rate', type=int, default=44100)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--out', default=None, help='write the results JSON here')
+    parser.add_argument('--baseline', default=None, help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='allowed p50 slow-down before flagging (0.10 = 10%%)')
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        datasets = {}
+        audio = sorted(p for p in glob.glob(os.path.join(args.audio, '*'))
+                       if p.lower().endswith(('.wav', '.flac', '.mp3')))
+        if audio:
+            datasets[os.path.basename(os.path.normpath(args.audio))] = audio
+        for seconds in args.synthetic:
+            datasets["synthetic_{:g}s".format(seconds)] = [
+                make_synthetic(tmp, seconds, args.synthetic_rate)]
+        results.update(bench_io(datasets, args.stages, args.repeats, args.warmup))
+
+    if "forward" in args.stages:
+        results.update(bench_forward(args.models, args.batch_sizes, args.threads,
+                                     args.repeats, args.warmup))
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline, 'r') as f_json:
+            regressions = compare(results, json.load(f_json)["results"], args.tolerance)
+
+    print('{:<44} {:>9} {:>9} {:>9} {:>10}'.format('measurement', 'p50 ms', 'p95 ms', 'p99 ms', 'files/s'))
+    for key, stats in results.items():
+        flag = '  REGRESSION x{:.2f}'.format(regressions[key]) if key in regressions else ''
+        print('{:<44} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.1f}{}'.format(
+            key, stats['p50_ms'], stats['p95_ms'], stats['p99_ms'], stats['files_per_sec'], flag))
+
+    if args.out:
+        report = {
+            "meta": {
+                "python": platform.python_version(),
+                "torch": torch.__version__,
+                "numpy": np.__version__,
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.out, 'w') as f_json:
+            json.dump(report, f_json, indent=2)
+
+    if regressions:
+        print('{} regression(s) beyond {:.0%}'.format(len(regressions), args.tolerance),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
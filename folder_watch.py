@@ -0,0 +1,237 @@
+"""
+Watches a folder for new or modified audio files.
+
+On Linux, inotify is used through libc (no extra package). Everywhere
+else, or on file systems without inotify (network shares written from
+other hosts), the folder is rescanned every poll_interval seconds.
+Either way a file is only reported once its size and mtime have stayed
+the same for `settle` seconds, so files still being copied are not
+scored half-written. A file is reported again when it changes later.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from audio_scan import AUDIO_EXTENSIONS, scan_audio
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct('iIII')
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class _Inotify:
+    """Minimal inotify binding: add_watch() and read() of changed paths"""
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, 'inotify is Linux only')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs = {}
+
+    def add_watch(self, folder):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), folder)
+        self._dirs[wd] = folder
+
+    def read(self, timeout):
+        """
+        Waits up to timeout seconds; returns (changed file paths,
+        new directories, overflowed)
+        """
+        files, dirs, overflow = [], [], False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return files, dirs, overflow
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return files, dirs, overflow
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            folder = self._dirs.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            (dirs if mask & IN_ISDIR else files).append(path)
+        return files, dirs, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Reports audio files that appear or change under a folder.
+
+    folder          : folder to watch
+    recursive       : also watch sub-folders (and ones created later)
+    settle          : seconds a file must stay unchanged before it is reported
+    poll_interval   : rescan period of the polling backend
+    existing        : also report the files already there at start
+    use_inotify     : None picks inotify when available, False forces polling
+    """
+    def __init__(self, folder, recursive=False, settle=1.0, poll_interval=1.0,
+                 existing=False, use_inotify=None, extensions=AUDIO_EXTENSIONS):
+        self.folder = folder
+        self.recursive = recursive
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.extensions = tuple(ext.lower() for ext in extensions)
+
+        # path -> stamp when reported; path -> (stamp, time it was last seen changing)
+        self._reported = {}
+        self._pending = {}
+        self._inotify = None
+        if use_inotify is not False:
+            try:
+                self._inotify = _Inotify()
+                for folder in self._folders():
+                    self._inotify.add_watch(folder)
+            except OSError:
+                if use_inotify:
+                    raise
+                if self._inotify is not None:
+                    self._inotify.close()
+                self._inotify = None
+        self._last_scan = time.monotonic()
+
+        for path in self._scan():
+            if existing:
+                self._touch(path)
+            else:
+                self._reported[path] = _stamp(path)
+
+    @property
+    def backend(self):
+        return 'inotify' if self._inotify is not None else 'polling'
+
+    def _folders(self):
+        yield self.folder
+        if self.recursive:
+            for root, dirs, _ in os.walk(self.folder):
+                for name in dirs:
+                    yield os.path.join(root, name)
+
+    def _watch_new_folder(self, folder):
+        """
+        Watches a folder created after start and every folder under it
+        (`mkdir -p` makes them faster than events arrive); returns the
+        files already in them, which may have landed before the watches.
+        A folder removed in the meantime is skipped.
+        """
+        files = []
+        for root, dirs, names in os.walk(folder):
+            try:
+                self._inotify.add_watch(root)
+            except OSError:
+                dirs[:] = []
+                continue
+            files.extend(os.path.join(root, name) for name in names)
+        return files
+
+    def _is_audio(self, path):
+        return path.lower().endswith(self.extensions)
+
+    def _scan(self):
+        """All audio files currently under the folder"""
+        return scan_audio(self.folder, recursive=self.recursive, extensions=self.extensions)
+
+    def _touch(self, path):
+        """Notes a (possible) change; the settle timer restarts if it did change"""
+        stamp = _stamp(path)
+        if stamp is None or self._reported.get(path) == stamp:
+            self._pending.pop(path, None)
+            return
+        pending = self._pending.get(path)
+        if pending is None or pending[0] != stamp:
+            self._pending[path] = (stamp, time.monotonic())
+
+    def poll(self, timeout=0.5):
+        """
+        Waits up to timeout seconds for changes and returns the files that
+        became ready (settled) since the last call, oldest first.
+        """
+        if self._inotify is not None:
+            # while files are settling, wake up in time to report them
+            if self._pending:
+                timeout = min(timeout, self.settle)
+            files, dirs, overflow = self._inotify.read(timeout)
+            if self.recursive:
+                for folder in dirs:
+                    files.extend(self._watch_new_folder(folder))
+            if overflow:
+                files.extend(self._scan())
+            for path in files:
+                if self._is_audio(path):
+                    self._touch(path)
+        else:
+            wait = self._last_scan + self.poll_interval - time.monotonic()
+            if wait > timeout:
+                time.sleep(timeout)
+            else:
+                time.sleep(max(wait, 0))
+                self._last_scan = time.monotonic()
+                for path in self._scan():
+                    self._touch(path)
+
+        # recheck the settling files: report those unchanged for `settle` seconds
+        now = time.monotonic()
+        ready = []
+        for path, (stamp, since) in sorted(self._pending.items(), key=lambda item: item[1][1]):
+            current = _stamp(path)
+            if current is None:
+                del self._pending[path]
+            elif current != stamp:
+                self._pending[path] = (current, now)
+            elif now - since >= self.settle:
+                del self._pending[path]
+                self._reported[path] = stamp
+                ready.append(path)
+        return ready
+
+    def watch(self, timeout=0.5, should_stop=None):
+        """Yields lists of ready files until should_stop() returns True"""
+        while should_stop is None or not should_stop():
+            ready = self.poll(timeout)
+            if ready:
+                yield ready
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
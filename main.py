@@ -1,122 +1,400 @@
-import matplotlib
-matplotlib.use('Qt5Agg') # Explicitly set the backend for PyQt
-
-import librosa
-import librosa.display
-import numpy as np
-import os, glob
+# torch (through the models), matplotlib, the audio stack and Qt multimedia
+# are imported on first use, so the window shows as soon as Qt is up
+import os
+import time
+from itertools import islice
 import warnings
-from datetime import datetime # Import the datetime module
 
-from main_aasist import aasist_model
-from main_rawnet import rawnet_model
+from audio_scan import scan_audio
 
-import matplotlib.pyplot as plt
+from PyQt6.QtWidgets import QMainWindow, QApplication, QLabel, QGridLayout, QPushButton, QFileDialog, QWidget, QHBoxLayout, QDialog, QTextEdit, QVBoxLayout, QTableView, QLineEdit
+from PyQt6.QtCore import Qt , QUrl, QObject, QThread, QTimer, QAbstractTableModel, QModelIndex, pyqtSignal
 
-from PyQt6.QtWidgets import QMainWindow, QApplication, QLabel, QGridLayout, QPushButton, QFileDialog, QWidget, QHBoxLayout, QDialog, QTextEdit, QVBoxLayout, QTableWidget, QTableWidgetItem
-from PyQt6.QtCore import Qt , QUrl
-from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+warnings.filterwarnings("ignore", category=FutureWarning)
 
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
-warnings.filterwarnings("ignore", category=FutureWarning)
 
 
+class ResultsTableModel(QAbstractTableModel):
+    """Read-only view of a results_store.ResultsStore, only visible rows are drawn."""
+    HEADERS = ["Filename", "prob of spoof (AASIST) (%)", "prob of spoof (RawNet) (%)", "prob of spoof (One-Class) (%)", "Final prob of spoof (%)"]
+    # column -> results_store column
+    COLUMNS = ["name", "aasist", "rawnet", "oc", "final"]
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.rows = store.select()
+        self.query = None
+        self.sort_column = None
+        self.descending = False
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            return Qt.AlignmentFlag.AlignCenter
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        row = int(self.rows[index.row()])
+        column = self.COLUMNS[index.column()]
+        if column == "name":
+            return self.store.filenames[row]
+        if column == "oc":
+            # oc_spoof_confidence is a placeholder until the One-Class model is trained
+            return 'N/A'
+        return f"{self.store.column(column)[row]*100:.2f}"
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # column -1 goes back to the order the results came in
+        self.sort_column = self.COLUMNS[column] if column >= 0 else None
+        self.descending = order == Qt.SortOrder.DescendingOrder
+        self._resort()
+
+    def set_filter(self, query):
+        """Raises ValueError on a malformed filter, the rows are then unchanged"""
+        from results_store import parse_filter
+        if query:
+            parse_filter(query)
+        self.query = query or None
+        # Other rows, not the same ones moved: views drop their selection
+        self.beginResetModel()
+        self.rows = self.store.select(self.query, self.sort_column, self.descending)
+        self.endResetModel()
+
+    def _resort(self):
+        """Reorders the rows shown; selections and other persistent indexes follow their rows"""
+        import numpy as np
+        self.layoutAboutToBeChanged.emit()
+        old_rows = self.rows
+        self.rows = self.store.select(self.query, self.sort_column, self.descending)
+        # store row -> new position
+        positions = np.empty(len(self.store), dtype=np.int64)
+        positions[self.rows] = np.arange(len(self.rows))
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(int(positions[old_rows[index.row()]]), index.column())
+                       for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def append(self, results):
+        start = self.store.extend(results)
+        new_rows = self.store.select(self.query, start=start)
+        if len(new_rows):
+            import numpy as np
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(new_rows) - 1)
+            self.rows = np.concatenate((self.rows, new_rows))
+            self.endInsertRows()
+            if self.sort_column is not None:
+                # New rows can land anywhere, sort again (vectorised, cheap next to the scoring)
+                self._resort()
 
 
 class ResultsDialog(QDialog):
     """A dialog to display test results in a proper table."""
+    # Streamed results are added in batches at most this often (ms)
+    APPEND_INTERVAL = 100
+    # file dialog filter -> result_export format, for names without a known extension
+    SAVE_FILTERS = {"CSV Files (*.csv)": "csv", "JSON Lines (*.jsonl)": "jsonl",
+                    "Parquet, needs pyarrow (*.parquet)": "parquet", "All Files (*)": "csv"}
+
     def __init__(self, results_data, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Test Results")
         self.setMinimumSize(950, 400)
-        self.results_data = results_data
+        from results_store import ResultsStore
+        self.store = ResultsStore()
+        self.model = ResultsTableModel(self.store, self)
+        self._pending = []
+        self._append_timer = QTimer(self)
+        self._append_timer.setSingleShot(True)
+        self._append_timer.timeout.connect(self._flush)
 
         # --- Layout and Widgets ---
         layout = QVBoxLayout(self)
 
-        # Create the table widget
-        self.table = QTableWidget()
-        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers) # Make table read-only
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText('Filter, e.g.  final > 0.8   aasist >= 50% and rawnet < 0.3   name ~ LA_E')
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.filter_changed)
+        layout.addWidget(self.filter_edit)
+
+        # Create the table view, rows are drawn from the model as they scroll in
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers) # Make table read-only
         self.table.setAlternatingRowColors(True)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.verticalHeader().minimumSectionSize())
+        # Results keep their arrival order until a header is clicked
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table.setSortingEnabled(True)
         layout.addWidget(self.table)
 
-        self._populate_table() # Fill the table with data
-
-        self.save_button = QPushButton("Save Results as CSV")
+        bottom_bar = QHBoxLayout()
+        self.count_label = QLabel()
+        bottom_bar.addWidget(self.count_label)
+        self.save_button = QPushButton("Save Results")
         self.save_button.setFixedSize(150, 40)
         self.save_button.clicked.connect(self.save_results)
-        layout.addWidget(self.save_button, alignment=Qt.AlignmentFlag.AlignRight)
+        bottom_bar.addWidget(self.save_button, alignment=Qt.AlignmentFlag.AlignRight)
+        layout.addLayout(bottom_bar)
 
         self.setLayout(layout)
 
-    def _populate_table(self):
-        """Fills the QTableWidget with the results data."""
-        if not self.results_data:
+        self._pending.extend(results_data)
+        self._flush()
+
+    def __len__(self):
+        return len(self.store) + len(self._pending)
+
+    def add_result(self, item_data):
+        """Queues one streamed result, the table is updated in batches."""
+        self._pending.append(item_data)
+        if not self._append_timer.isActive():
+            self._append_timer.start(self.APPEND_INTERVAL)
+
+    def _flush(self):
+        if self._pending:
+            first = len(self.store) == 0
+            pending, self._pending = self._pending, []
+            self.model.append(pending)
+            if first:
+                self.table.resizeColumnsToContents()
+        self._update_count()
+
+    def _update_count(self):
+        shown, total = self.model.rowCount(), len(self.store)
+        self.count_label.setText(f'{total} results' if shown == total else f'{shown} of {total} results')
+
+    def filter_changed(self, text):
+        try:
+            self.model.set_filter(text.strip())
+        except ValueError as e:
+            self.filter_edit.setStyleSheet('color: red')
+            self.filter_edit.setToolTip(str(e))
             return
-
-        headers = ["Filename", "prob of spoof (AASIST) (%)", "prob of spoof (RawNet) (%)", "prob of spoof (One-Class) (%)", "Final prob of spoof (%)"]
-        self.table.setRowCount(len(self.results_data))
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
-
-        for row_idx, item_data in enumerate(self.results_data):
-            # Create QTableWidgetItem for each piece of data
-            filename = QTableWidgetItem(item_data['filename'])
-            a_spoof_confidence = QTableWidgetItem(f"{item_data['a_spoof_confidence']*100:.2f}")
-            r_spoof_confidence = QTableWidgetItem(f"{item_data['r_spoof_confidence']*100:.2f}")
-            # oc_spoof_confidence and oc_result are placeholders as in the original code
-            oc_spoof_confidence = QTableWidgetItem('N/A') # Set to N/A as per original code for display
-            final_score = QTableWidgetItem(f"{item_data['final_score']*100:.2f}")
-
-            # Center-align the scores and results for better readability
-            # Note: oc_spoof_confidence and final_result are also included for alignment,
-            #       even though oc_spoof_confidence might be 'N/A'.
-            for cell in [filename, a_spoof_confidence, r_spoof_confidence, oc_spoof_confidence, final_score]:
-                cell.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-
-            # Place items into the table
-            self.table.setItem(row_idx, 0, filename)
-            self.table.setItem(row_idx, 1, a_spoof_confidence)
-            self.table.setItem(row_idx, 2, r_spoof_confidence)
-            self.table.setItem(row_idx, 3, oc_spoof_confidence)
-            self.table.setItem(row_idx, 4, final_score)
-
-        # Automatically resize columns to fit the content
-        self.table.resizeColumnsToContents()
+        self.filter_edit.setStyleSheet('')
+        self.filter_edit.setToolTip('')
+        self._update_count()
 
     def save_results(self):
-        """Opens a file dialog to save the results as a CSV file."""
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "Save Results", "", "CSV Files (*.csv);;All Files (*)"
+        """Saves the shown results (filtered and sorted) with raw scores, as CSV, JSON Lines or Parquet."""
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Save Results", "", ";;".join(self.SAVE_FILTERS)
         )
         if file_path:
+            self._flush()
             try:
-                with open(file_path, 'w', newline='') as f: # Added newline='' for proper CSV writing
-                    # Get current date and time
-                    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    f.write(f"Results generated on: {current_time}\n\n") # Write date and time, followed by an extra newline for spacing
-
-                    # Write header
-                    headers = [self.table.horizontalHeaderItem(i).text() for i in range(self.table.columnCount())]
-                    f.write(",".join(headers) + "\n")
-                    # Write data rows
-                    for row in range(self.table.rowCount()):
-                        row_data = []
-                        for col in range(self.table.columnCount()):
-                            item = self.table.item(row, col)
-                            if item is not None:
-                                row_data.append(item.text())
-                            else:
-                                row_data.append('') # Handle empty cells
-                        f.write(",".join(row_data) + "\n")
+                from result_export import EXTENSIONS, open_writer
+                from scoring import model_versions
+                fmt = None
+                if os.path.splitext(file_path)[1].lower() not in EXTENSIONS:
+                    fmt = self.SAVE_FILTERS.get(selected_filter, "csv")
+                with open_writer(file_path, fmt, metadata=model_versions()) as writer:
+                    writer.write_many(self.store.result(row) for row in self.model.rows)
             except Exception as e:
                 print(f"Error saving file: {e}")
 
      
         
 
+def _open_score_cache():
+    # Files scored in an earlier run come back from the cache without decoding
+    from score_cache import ScoreCache
+    try:
+        return ScoreCache()
+    except Exception as e:
+        print('Score cache disabled: {}'.format(e))
+        return None
+
+
+class FolderTestWorker(QObject):
+    """Scores a list of files off the GUI thread and streams the results."""
+    result_ready = pyqtSignal(object)
+    progress = pyqtSignal(int, int, float) # done, total (-1 while scanning), files per second
+    file_failed = pyqtSignal(str, str) # path, error; the test goes on
+    failed = pyqtSignal(str)
+    finished = pyqtSignal(bool) # True if cancelled
+
+    def __init__(self, files, batch_size=None, parent=None):
+        super().__init__(parent)
+        # A list, or a lazy folder scan whose length is only known at the end
+        self.files = files
+        self.total = len(files) if hasattr(files, '__len__') else None
+        self.done = 0
+        self.batch_size = batch_size
+        self._cancelled = False
+
+    def cancel(self):
+        # Checked between batches, the batch in flight is allowed to finish
+        self._cancelled = True
+
+    def run(self):
+        self._start = time.perf_counter()
+        paths = iter(self.files)
+        cache = None
+        try:
+            from model_registry import registry
+            from scoring import iter_scores
+            self.batch_size = self.batch_size or registry.get_config("AASIST")["batch_size"]
+            cache = _open_score_cache()
+            while not self._cancelled:
+                batch = list(islice(paths, self.batch_size))
+                if not batch:
+                    self.total = self.done
+                    break
+                for result in iter_scores(batch, self.batch_size, cache=cache, on_error=self._skip):
+                    self.done += 1
+                    self.result_ready.emit(result)
+                    self._report_progress()
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            if cache is not None:
+                cache.close()
+        self.finished.emit(self._cancelled)
+
+    def _skip(self, path, error):
+        # A file that cannot be decoded or scored is reported and counted as done
+        self.done += 1
+        self.file_failed.emit(path, str(error) or type(error).__name__)
+        self._report_progress()
+
+    def _report_progress(self):
+        total = -1 if self.total is None else self.total
+        self.progress.emit(self.done, total, self.done / max(time.perf_counter() - self._start, 1e-9))
+
+
+class FolderWatchWorker(QObject):
+    """Scores audio files as they land in a folder, until stopped."""
+    result_ready = pyqtSignal(object)
+    watching = pyqtSignal(str) # watcher backend, once the models are warm
+    file_failed = pyqtSignal(str, str) # path, error; the watch goes on
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, folder, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self._stopped = False
+
+    def stop(self):
+        # Checked every poll, files already being scored are finished first
+        self._stopped = True
+
+    def run(self):
+        watcher = None
+        cache = None
+        try:
+            from folder_watch import FolderWatcher
+            from model_registry import registry
+            from scoring import score_or_skip
+            # Build both models up front so new files are scored right away
+            registry.get("AASIST")
+            registry.get("RawNet")
+            cache = _open_score_cache()
+            watcher = FolderWatcher(self.folder, recursive=True)
+            self.watching.emit(watcher.backend)
+            for ready in watcher.watch(should_stop=lambda: self._stopped):
+                report = lambda path, e: self.file_failed.emit(path, str(e) or type(e).__name__)
+                for result in score_or_skip(ready, report, cache=cache):
+                    self.result_ready.emit(result)
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            if watcher is not None:
+                watcher.close()
+            if cache is not None:
+                cache.close()
+        self.finished.emit()
+
+
+class FileTestWorker(QObject):
+    """Scores the selected file off the GUI thread, so a slow or failing model cannot freeze or abort the window."""
+    ready = pyqtSignal(object, object) # result, 16 kHz model input
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, path, waveform=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.waveform = waveform
+
+    def run(self):
+        try:
+            from audio_frontend import load_audio
+            from model_registry import registry
+            from scoring import resample_quality, score_waveforms
+            # Test decodes only the model input; the preview decodes the file separately at its own rate
+            waveform = self.waveform
+            if waveform is None:
+                nb_samp = registry.get_config("AASIST")["model_config"]["nb_samp"]
+                waveform = load_audio(self.path, quality=resample_quality(), max_samples=nb_samp)
+            self.ready.emit(score_waveforms([self.path], [waveform])[0], waveform)
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+        self.finished.emit()
+
+
+class ModelWarmupWorker(QObject):
+    """Builds both models and runs a dummy batch while the user picks a file."""
+    ready = pyqtSignal(float) # seconds it took
+    failed = pyqtSignal(str)
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            import numpy as np
+            from model_registry import registry
+            from scoring import score_waveforms
+            # The first forward pass also pays for one-off allocations and kernel selection
+            nb_samp = registry.get_config("AASIST")["model_config"]["nb_samp"]
+            score_waveforms(['warm-up'], [np.zeros(nb_samp, dtype=np.float32)])
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.ready.emit(time.perf_counter() - start)
+
+
+class PreviewWorker(QObject):
+    """Builds waveform / spectrogram previews off the GUI thread."""
+    ready = pyqtSignal(str, object) # path, audio_preview.Preview
+    failed = pyqtSignal(str, str) # path, error
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = None
+        self.latest = None
+
+    def load(self, path, columns):
+        # Files opened while this one was loading made it stale
+        if path != self.latest:
+            return
+        try:
+            if self.cache is None:
+                from audio_preview import PreviewCache
+                self.cache = PreviewCache()
+            preview = self.cache.get(path, columns)
+        except Exception as e:
+            self.failed.emit(path, str(e))
+            return
+        self.ready.emit(path, preview)
+
+
 class Window(QMainWindow):
+    preview_requested = pyqtSignal(str, int) # path, canvas width in pixels
+
     
     def __init__(self, *args, **kwargs):
         
@@ -128,14 +406,49 @@ class Window(QMainWindow):
         parent_layout = QGridLayout()
         
         self.audio_path = None
+        self.audio_data = None # 16 kHz model input of the selected file, decoded on Test
         self.audio_folder=None
-        self.audio_folder_files = []
-        
-        # Set up the player and audio output
-        self.player = QMediaPlayer()
-        self.audio_output = QAudioOutput()
-        self.player.setAudioOutput(self.audio_output)
-        self.player.mediaStatusChanged.connect(self.media_status_changed_Handler)
+
+        # Background folder test
+        self.test_thread = None
+        self.test_worker = None
+        self.test_running = False
+        self.test_skipped = 0
+        self.results_dialog = None
+
+        # Previews are built on their own thread and cached
+        self.preview_thread = QThread(self)
+        self.preview_worker = PreviewWorker()
+        self.preview_worker.moveToThread(self.preview_thread)
+        self.preview_requested.connect(self.preview_worker.load)
+        self.preview_worker.ready.connect(self.preview_ready_Handler)
+        self.preview_worker.failed.connect(self.preview_failed_Handler)
+        self.preview_thread.start()
+
+        # Watch-folder mode
+        self.watch_thread = None
+        self.watch_worker = None
+        self.watch_dialog = None
+        self.watch_folder = None
+
+        # Models are built and warmed up in the background once the window is up
+        # Test stays disabled until then, scoring on the GUI thread would wait for the build
+        self.models_ready = False
+        self.models_label = QLabel('Loading models...')
+        self.statusBar().addPermanentWidget(self.models_label)
+        self.warmup_thread = QThread(self)
+        self.warmup_worker = ModelWarmupWorker()
+        self.warmup_worker.moveToThread(self.warmup_thread)
+        self.warmup_thread.started.connect(self.warmup_worker.run)
+        self.warmup_worker.ready.connect(self.models_ready_Handler)
+        self.warmup_worker.failed.connect(self.models_failed_Handler)
+        self.warmup_worker.ready.connect(self.warmup_thread.quit)
+        self.warmup_worker.failed.connect(self.warmup_thread.quit)
+        QTimer.singleShot(0, self.warmup_thread.start)
+
+        # The player and audio output are set up when the first file is opened
+        self.player = None
+        self.audio_output = None
 
         
         # Top Bar
@@ -151,6 +464,10 @@ class Window(QMainWindow):
         self.open_folder_btn.setFixedSize(120, 40)
         
         self.open_folder_btn.clicked.connect(self.open_folder_btn_Handler)
+
+        self.watch_btn = QPushButton('Watch')
+        self.watch_btn.setFixedSize(100, 40)
+        self.watch_btn.clicked.connect(self.watch_btn_Handler)
         
         self.file_label = QLabel('Select File via Open')
         self.file_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -161,6 +478,7 @@ class Window(QMainWindow):
         self.audio_btn.setEnabled(False) # Disabled by default
         
         self.center_top_bar.addWidget(self.open_folder_btn)
+        self.center_top_bar.addWidget(self.watch_btn)
         self.center_top_bar.addWidget(self.file_label)
         self.center_top_bar.addWidget(self.audio_btn)
         # ---------------------------------------------------------------------
@@ -173,14 +491,17 @@ class Window(QMainWindow):
         # Mel - Spectrogram Bar
         self.mel_spec_label = QLabel('Spectrogram')
         self.mel_spec_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.fig_spec , self.ax_spec = plt.subplots()
-        self.mel_spec_canvas = FigureCanvas(self.fig_spec)
+        # Placeholders until the first file brings in matplotlib, see _ensure_plots
+        self.fig_spec, self.ax_spec = None, None
+        self.mel_spec_canvas = QLabel('Open a file to see its spectrogram')
+        self.mel_spec_canvas.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # Waveform Bar
         self.waveform_label=QLabel('Audio Waveform')
         self.waveform_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.fig_waveform, self.ax_waveform = plt.subplots()
-        self.waveform_canvas = FigureCanvas(self.fig_waveform)
+        self.fig_waveform, self.ax_waveform = None, None
+        self.waveform_canvas = QLabel('Open a file to see its waveform')
+        self.waveform_canvas.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         # Result Bar
         result_layout = QHBoxLayout()
@@ -231,10 +552,9 @@ class Window(QMainWindow):
         if dialog_return:
             self.file_label.setText(self.audio_path.split('/')[-1])
             self.audio_folder=None
-            self.audio_folder_files=[]
             self.audio_btn.setText("Play")
             self.audio_btn.setEnabled(True)
-            self.test_btn.setEnabled(True)
+            self.test_btn.setEnabled(self.models_ready)
             self.display_audio_Handler()
             
             
@@ -246,24 +566,22 @@ class Window(QMainWindow):
         dialog.setOption(QFileDialog.Option.DontUseNativeDialog, True)
 
         if dialog.exec():
+            # The folder is only scanned by the test, on its worker thread: probing
+            # a large tree with no audio here would freeze the window
             self.audio_folder = dialog.selectedFiles()[0]
-            extensions=('*.mp3', '*.wav', '*.flac')
-            for ext in extensions:
-                self.audio_folder_files.extend(glob.glob(os.path.join(self.audio_folder, ext)))
-            if not self.audio_folder_files:
-                self.file_label.setText('No Audio file found in folder')
-            else:
-                self.file_label.setText(f"{os.path.basename(self.audio_folder)} ({len(self.audio_folder_files)} files)")
-                self.audio_path = None
-                self.audio_btn.setEnabled(False)
-                self.test_btn.setEnabled(True)
+            self.file_label.setText(f"{os.path.basename(self.audio_folder)} (with sub-folders)")
+            self.audio_path = None
+            self.audio_data = None
+            self.audio_btn.setEnabled(False)
+            self.test_btn.setEnabled(self.models_ready)
 
             
     
     def audio_btn_Handler(self):
         
-        if self.audio_path is None:
+        if self.audio_path is None or self.player is None:
             return
+        from PyQt6.QtMultimedia import QMediaPlayer
         if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
             self.player.pause()
             self.audio_btn.setText("Play")
@@ -274,31 +592,35 @@ class Window(QMainWindow):
             
     def test_btn_Handler(self):
         
+        # While a folder test is running the button cancels it
+        if self.test_running:
+            self.test_worker.cancel()
+            self.test_btn.setEnabled(False)
+            self.final_result_label.setText('Cancelling...')
+            return
 
         files_to_process = []
         if self.audio_path:
-            # files_to_process.append(self.audio_path) # No need to append to this list if processing single file immediately
-            a_spoof_confidence, a_result = aasist_model(self.audio_path)
-            r_spoof_confidence, r_result = rawnet_model(self.audio_path)
-            # oc_spoof_confidence and oc_result are placeholders as in the original code
-            oc_spoof_confidence, oc_result = 0, 0 # Keep as 0, 0 for now as per current logic
-            
-            # Determine final result by majority vote (from the 3 models - assuming oc_result is 0)
-            final_result_bool = (a_result + r_result + oc_result) >= 2
-            # Average score of the two active models
-            final_spoof_confidence = (a_spoof_confidence + r_spoof_confidence) / 2
-            
-            self.aasist_label.setText(f'prob of spoof (AASIST): {a_spoof_confidence*100:.2f} ')
-            self.rawnet_label.setText(f'prob of spoof (RawNet): {r_spoof_confidence*100:.2f} ')
-            self.one_class_label.setText(f'prob of spoof (One-Class): N/A')
-            self.final_result_label.setText(f'Final prob of spoof : {final_spoof_confidence*100:.2f} % ') # Corrected display
-            
-            # For single file, still show in dialog for consistency if desired, otherwise remove.
-            # Currently, single file results are displayed in labels, not the dialog.
+            # Single file results are displayed in the labels, not the dialog
+            self.final_result_label.setText('Final prob of spoof : Processing...')
+            self.test_thread = QThread(self)
+            self.test_worker = FileTestWorker(self.audio_path, self.audio_data)
+            self.test_worker.moveToThread(self.test_thread)
+            self.test_thread.started.connect(self.test_worker.run)
+            self.test_worker.ready.connect(self.file_test_ready_Handler)
+            self.test_worker.failed.connect(self.file_test_failed_Handler)
+            self.test_worker.finished.connect(self.file_test_finished_Handler)
+            self.test_worker.finished.connect(self.test_thread.quit)
+
+            self.test_btn.setEnabled(False)
+            self.open_btn.setEnabled(False)
+            self.open_folder_btn.setEnabled(False)
+            self.test_thread.start()
             return
             
-        elif self.audio_folder_files:
-            files_to_process.extend(self.audio_folder_files)
+        elif self.audio_folder:
+            # Scoring starts with the first files found, the scan goes on meanwhile
+            files_to_process = scan_audio(self.audio_folder)
             # Reset labels when processing a folder
             self.aasist_label.setText(f'prob of spoof (AASIST): Processing...')
             self.rawnet_label.setText(f'prob of spoof (RawNet): Processing...')
@@ -308,49 +630,176 @@ class Window(QMainWindow):
             self.final_result_label.setText("Please select a file or folder first.")
             return
 
-        all_results_data = []
-        for file_path in files_to_process:
-            a_spoof_confidence, a_result_raw = aasist_model(file_path)
-            r_spoof_confidence, r_result_raw = rawnet_model(file_path)
-            
-            # Assume a_result_raw and r_result_raw are 0 for bonafide, 1 for spoofed (or vice versa, check your model's output)
-            # For a_result and r_result in the table, we want "Bonafide" or "Spoofed" string.
-            # Let's assume 0 means bonafide and 1 means spoofed from your model's a_result and r_result.
-            # If your model outputs 0 for spoofed and 1 for bonafide, you'd reverse these.
-            
-            # oc_spoof_confidence and oc_result are placeholders
-            oc_spoof_confidence, oc_result_raw = 0, 0 
-
-            # Determine final result by majority vote (from the 3 models)
-            # Ensure consistency: if 0 is Bonafide and 1 is Spoofed:
-            # We want to count how many models say "spoofed"
-            # spoofed_count = 0
-            # if a_result_raw == 1: # Assuming 1 means spoofed
-            #     spoofed_count += 1
-            # if r_result_raw == 1:
-            #     spoofed_count += 1
-            # if oc_result_raw == 1:
-            #     spoofed_count += 1
-
-            # final_result_bool = (spoofed_count >= 2) # True if 2 or more models say spoofed
-
-            # Average score of the two active models
-            final_score = (a_spoof_confidence + r_spoof_confidence) / 2
-            # final_result_str = "Spoofed" if final_result_bool else "Bonafide"
-
-            # Store data for the results dialog
-            all_results_data.append({
-                "filename": os.path.basename(file_path),
-                "a_spoof_confidence": a_spoof_confidence, 
-                "r_spoof_confidence": r_spoof_confidence, 
-                "oc_spoof_confidence": oc_spoof_confidence, # Keep this even if N/A for consistency
-                "final_score": final_score, 
-            })
-            
-        if all_results_data: # Check if there is data to display
-            dialog = ResultsDialog(all_results_data, self) 
-            dialog.exec()
-  
+        # Results are streamed into the dialog while the folder is scored in the background
+        self.results_dialog = ResultsDialog([], self)
+        self.results_dialog.show()
+
+        self.test_thread = QThread(self)
+        self.test_worker = FolderTestWorker(files_to_process)
+        self.test_worker.moveToThread(self.test_thread)
+        self.test_thread.started.connect(self.test_worker.run)
+        self.test_worker.result_ready.connect(self.results_dialog.add_result)
+        self.test_worker.progress.connect(self.test_progress_Handler)
+        self.test_worker.file_failed.connect(self.test_file_failed_Handler)
+        self.test_worker.failed.connect(self.test_failed_Handler)
+        self.test_worker.finished.connect(self.test_finished_Handler)
+        self.test_worker.finished.connect(self.test_thread.quit)
+
+        self.test_running = True
+        self.test_skipped = 0
+        self.test_btn.setText('Cancel')
+        self.open_btn.setEnabled(False)
+        self.open_folder_btn.setEnabled(False)
+        self.test_thread.start()
+
+    def file_test_ready_Handler(self, result, waveform):
+        if result['path'] == self.audio_path:
+            # Kept for the next Test of the same file
+            self.audio_data = waveform
+        a_spoof_confidence, a_result = result['a_spoof_confidence'], result['a_result']
+        r_spoof_confidence, r_result = result['r_spoof_confidence'], result['r_result']
+        # oc_spoof_confidence and oc_result are placeholders as in the original code
+        oc_spoof_confidence, oc_result = 0, 0 # Keep as 0, 0 for now as per current logic
+
+        # Determine final result by majority vote (from the 3 models - assuming oc_result is 0)
+        final_result_bool = (a_result + r_result + oc_result) >= 2
+        # Average score of the two active models
+        final_spoof_confidence = (a_spoof_confidence + r_spoof_confidence) / 2
+
+        self.aasist_label.setText(f'prob of spoof (AASIST): {a_spoof_confidence*100:.2f} ')
+        self.rawnet_label.setText(f'prob of spoof (RawNet): {r_spoof_confidence*100:.2f} ')
+        self.one_class_label.setText(f'prob of spoof (One-Class): N/A')
+        self.final_result_label.setText(f'Final prob of spoof : {final_spoof_confidence*100:.2f} % ') # Corrected display
+
+    def file_test_failed_Handler(self, message):
+        self.final_result_label.setText(f'Test failed: {message}')
+        print(f"Test of {self.audio_path} failed: {message}")
+
+    def file_test_finished_Handler(self):
+        if self.test_thread is not None:
+            self.test_thread.quit()
+            self.test_thread.wait()
+        self.test_btn.setEnabled(True)
+        self.open_btn.setEnabled(True)
+        self.open_folder_btn.setEnabled(True)
+
+    def test_progress_Handler(self, done, total, files_per_sec):
+        if total < 0:
+            self.final_result_label.setText(f'Processed {done} files, still scanning ({files_per_sec:.2f} files/s)')
+        else:
+            self.final_result_label.setText(f'Processed {done}/{total} files ({files_per_sec:.2f} files/s)')
+
+    def test_file_failed_Handler(self, path, error):
+        # The file is left out of the results, the test goes on
+        self.test_skipped += 1
+        print(f"Folder test: {path} not scored: {error}")
+
+    def test_failed_Handler(self, message):
+        self.final_result_label.setText(f'Folder test failed: {message}')
+
+    def test_finished_Handler(self, cancelled):
+        done = self.test_worker.done
+        total = self.test_worker.total
+        if cancelled:
+            self.final_result_label.setText(f'Cancelled after {done} files')
+        elif done == 0 and total == 0:
+            self.final_result_label.setText('No Audio file found in folder')
+        elif done == total:
+            skipped = f', {self.test_skipped} could not be scored' if self.test_skipped else ''
+            self.final_result_label.setText(f'Finished {done} files{skipped}')
+        self.aasist_label.setText('prob of spoof (AASIST):  see results')
+        self.rawnet_label.setText('prob of spoof (RawNet):  see results')
+        self.one_class_label.setText('prob of spoof (One-Class): N/A')
+        self.test_btn.setText('Test')
+        self.test_btn.setEnabled(True)
+        self.open_btn.setEnabled(True)
+        self.open_folder_btn.setEnabled(True)
+        self.test_running = False
+
+    def watch_btn_Handler(self):
+
+        # While watching the button stops the watch
+        if self.watch_worker is not None:
+            self.watch_worker.stop()
+            self.watch_btn.setEnabled(False)
+            self.watch_btn.setText('Stopping...')
+            return
+
+        # Watch the selected folder, or ask for one
+        folder = self.audio_folder
+        if not folder:
+            folder = QFileDialog.getExistingDirectory(self, 'Select Folder to Watch')
+            if not folder:
+                return
+        self.watch_folder = folder
+
+        # New files are appended to their own results window as they are scored
+        self.watch_dialog = ResultsDialog([], self)
+        self.watch_dialog.setWindowTitle(f'Watching {os.path.basename(folder)}')
+        self.watch_dialog.show()
+
+        self.watch_thread = QThread(self)
+        self.watch_worker = FolderWatchWorker(folder)
+        self.watch_worker.moveToThread(self.watch_thread)
+        self.watch_thread.started.connect(self.watch_worker.run)
+        self.watch_worker.result_ready.connect(self.watch_dialog.add_result)
+        self.watch_worker.result_ready.connect(self.watch_result_Handler)
+        self.watch_worker.watching.connect(self.watch_started_Handler)
+        self.watch_worker.file_failed.connect(self.watch_file_failed_Handler)
+        self.watch_worker.failed.connect(self.watch_failed_Handler)
+        self.watch_worker.finished.connect(self.watch_finished_Handler)
+        self.watch_worker.finished.connect(self.watch_thread.quit)
+
+        self.watch_btn.setText('Stop')
+        self.final_result_label.setText(f'Loading models to watch {folder}...')
+        self.watch_thread.start()
+
+    def watch_started_Handler(self, backend):
+        self.final_result_label.setText(f'Watching {self.watch_folder} ({backend}) for new audio files')
+
+    def watch_result_Handler(self, result):
+        done = len(self.watch_dialog)
+        self.final_result_label.setText(
+            f'Watching {self.watch_folder}: {done} new files scored, last {result["filename"]} '
+            f'({result["final_score"]*100:.2f} %)')
+
+    def watch_file_failed_Handler(self, path, error):
+        self.final_result_label.setText(
+            f'Watching {self.watch_folder}: could not score {os.path.basename(path)} ({error})')
+        print(f"Watch: {path} not scored: {error}")
+
+    def watch_failed_Handler(self, message):
+        self.final_result_label.setText(f'Watch failed: {message}')
+
+    def watch_finished_Handler(self):
+        if self.watch_thread is not None:
+            self.watch_thread.quit()
+            self.watch_thread.wait()
+        self.watch_thread = None
+        self.watch_worker = None
+        self.watch_btn.setText('Watch')
+        self.watch_btn.setEnabled(True)
+
+    def closeEvent(self, event):
+        # Stop a running folder test or watch before the window and its threads go away
+        if self.test_running:
+            self.test_worker.cancel()
+        if self.test_thread is not None:
+            self.test_thread.quit()
+            self.test_thread.wait()
+        if self.watch_worker is not None:
+            self.watch_worker.stop()
+        if self.watch_thread is not None:
+            self.watch_thread.quit()
+            self.watch_thread.wait()
+        self.preview_worker.latest = None
+        self.preview_thread.quit()
+        self.preview_thread.wait()
+        # A warm-up in progress cannot be interrupted, it ends on its own
+        self.warmup_thread.quit()
+        self.warmup_thread.wait()
+        super().closeEvent(event)
+
     # This method is no longer used since ResultsDialog now handles table display directly.
     # It can be removed or kept for reference if text display logic is needed elsewhere.
     def _format_results_for_display(self, results_data):
@@ -393,28 +842,98 @@ class Window(QMainWindow):
     
     def display_audio_Handler(self):
         
-        audio_data, sample_rate = librosa.load(self.audio_path)
-        
+        # Only the start of the file is scored, Test decodes it
+        self.audio_data = None
+
+        # The plots are reduced to the canvas width on the preview thread
+        self.mel_spec_label.setText('Spectrogram\n(loading...)')
+        columns = max(int(self.waveform_canvas.width() * self.waveform_canvas.devicePixelRatioF()), 1)
+        self.preview_worker.latest = self.audio_path
+        self.preview_requested.emit(self.audio_path, columns)
+
+        self._ensure_player()
+        self.player.setSource(QUrl.fromLocalFile(self.audio_path))
+
+
+    def _ensure_player(self):
+
+        if self.player is not None:
+            return
+        from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+        self.player = QMediaPlayer()
+        self.audio_output = QAudioOutput()
+        self.player.setAudioOutput(self.audio_output)
+        self.player.mediaStatusChanged.connect(self.media_status_changed_Handler)
+
+
+    def _ensure_plots(self):
+
+        # Swaps the placeholders for matplotlib canvases on the first preview
+        if self.fig_spec is not None:
+            return
+        import matplotlib
+        matplotlib.use('Qt5Agg') # Explicitly set the backend for PyQt
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
+        layout = self.centralWidget().layout()
+        self.fig_spec , self.ax_spec = plt.subplots()
+        self.fig_waveform, self.ax_waveform = plt.subplots()
+        for name, figure in (('mel_spec_canvas', self.fig_spec), ('waveform_canvas', self.fig_waveform)):
+            placeholder = getattr(self, name)
+            canvas = FigureCanvas(figure)
+            layout.replaceWidget(placeholder, canvas)
+            placeholder.deleteLater()
+            setattr(self, name, canvas)
+
+
+    def preview_ready_Handler(self, path, preview):
+
+        if path != self.audio_path:
+            return
+        self.mel_spec_label.setText('Spectrogram')
+        from audio_preview import draw_mel_spectrogram, draw_waveform
+        self._ensure_plots()
+
         # Mel Spectrogram
-        self.ax_spec.clear()
-        S = librosa.feature.melspectrogram(y=audio_data, sr=sample_rate, n_mels=128)
-        S_dB = librosa.power_to_db(S, ref=np.max)
-        img = librosa.display.specshow(S_dB, sr=sample_rate, x_axis='time', y_axis='mel', cmap='viridis', ax=self.ax_spec)
-        # self.ax_spec.colorbar(format='%+2.0f dB')
-        self.ax_spec.set_title('Mel-Spectrogram')
+        draw_mel_spectrogram(self.ax_spec, preview)
         self.mel_spec_canvas.draw()
-        
+
         # Audio Waveform
-        self.ax_waveform.clear()
-        librosa.display.waveshow(y=audio_data, sr=sample_rate, axis='time', ax=self.ax_waveform)
-        self.ax_waveform.set_title("Waveform")
+        draw_waveform(self.ax_waveform, preview)
         self.waveform_canvas.draw()
+
+
+    def preview_failed_Handler(self, path, error):
+
+        if path == self.audio_path:
+            self.mel_spec_label.setText('Spectrogram\n(unreadable)')
+            print(f"Preview of {path} failed: {error}")
         
-        self.player.setSource(QUrl.fromLocalFile(self.audio_path))
-        
+
+    def models_ready_Handler(self, seconds):
+
+        self.models_label.setText(f'Models ready ({seconds:.1f} s)')
+        self._enable_test()
+
+
+    def models_failed_Handler(self, error):
+
+        self.models_label.setText('Models failed to load')
+        print(f"Model warm-up failed: {error}")
+        # Test builds the models again on its worker and shows the error
+        self._enable_test()
+
+
+    def _enable_test(self):
+
+        self.models_ready = True
+        self.test_btn.setEnabled(bool(self.audio_path or self.audio_folder))
+
 
     def media_status_changed_Handler(self, status):
         
+        from PyQt6.QtMultimedia import QMediaPlayer
         if status == QMediaPlayer.MediaStatus.EndOfMedia:
             self.audio_btn.setText("Play")
 
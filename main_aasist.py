@@ -27,32 +27,30 @@ from torch import Tensor
 import torch
 import torch.nn as nn
 from torch.utils.data import DataLoader
-from torchcontrib.optim import SWA
 import numpy as np
 
 from aasist_utils import set_seed
-import soundfile as sf
-import librosa
+from model_registry import registry
+from models.AASIST import GraphAttentionLayer, HtrgGraphAttentionLayer
+from models.quantization import quantize_dynamic, quantize_mode
+from model_export import existing_artifact, load_artifact
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-def pad(x, max_len=64600):
-    x_len = x.shape[0]
-    if x_len >= max_len:
-        return x[:max_len]
-    # need to pad
-    num_repeats = int(max_len / x_len) + 1
-    padded_x = np.tile(x, (1, num_repeats))[:, :max_len][0]
-    return padded_x
 
-def aasist_model(audio_path):
-    
-    # load experiment configurations
-    
-    config_file = 'config/AASIST.conf'
-    
-    with open(config_file, "r") as f_json:
-        config = json.loads(f_json.read())
+CONFIG_FILE = 'config/AASIST.conf'
+
+
+def weights_path(config: Dict) -> str:
+    """Path of the pretrained weights named by the config, or of the exported artifact"""
+    backend = config.get("backend", "eager")
+    if backend != "eager":
+        return existing_artifact("AASIST", backend, config.get("compiled_dir"))
+    return config["model_path"]
+
+
+def build_model(config: Dict, device: torch.device):
+    """Builds AASIST from a loaded config and loads its pretrained weights"""
     model_config = config["model_config"]
     # optim_config = config["optim_config"]
     # optim_config["epochs"] = config["num_epochs"]
@@ -65,39 +63,58 @@ def aasist_model(audio_path):
 
     # make experiment reproducible
     set_seed(1234, config)
-    
-    # set device
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    # print("Device: {}".format(device))
+
+    # compiled backends load the artifact written by `spoofdetect export`
+    backend = config.get("backend", "eager")
+    if backend != "eager":
+        return load_artifact(weights_path(config), backend, device, config.get("quantize"))
 
     # define model architecture
     model = get_model(model_config, device)
 
-
-    # evaluates pretrained model and exit script
+    # evaluates pretrained model
     model.load_state_dict(
-        torch.load(config["model_path"], map_location=device))
+        torch.load(weights_path(config), map_location=device))
     # print("Model loaded : {}".format(config["model_path"]))
+    model.eval()
 
-    # eval according to the choices by the user
+    # "quantize": "dynamic" runs the graph attention projections in int8 (CPU).
+    # They are small (gat_dims wide), so check benchmarks/quantization.py first.
+    if quantize_mode(config, device) == "dynamic":
+        model = quantize_dynamic(model, {nn.Linear},
+                                 scopes=(GraphAttentionLayer, HtrgGraphAttentionLayer))
 
-    X,fs = sf.read(audio_path) 
-    X_pad= pad(X,64600)
-    x_inp= Tensor(X_pad)
-    x_inp = x_inp.view(1, -1)
-    # print("audio file loaded")
+    return model
 
-    # print("let's begin inference")
-    model.eval()
-    x_inp = x_inp.to(device)
-    _,pred = model(x_inp)
+
+registry.register("AASIST", CONFIG_FILE, build_model, weights_path)
+
+
+def predict(model, x_inp):
+    """
+    x_inp   :(#bs, #samp)
+    returns spoof probabilities (#bs) and predicted classes (#bs)
+    """
+    with torch.no_grad():
+        _,pred = model(x_inp)
     softmax_probs = torch.softmax(pred, dim=1)
     _, predicted_class = torch.max(softmax_probs, 1)
-    spoofed_confidence_class_probs = softmax_probs[0,0]
-    # Get the softmax probability values of the predicted class
-    predicted_class_probs = softmax_probs.gather(1, predicted_class.unsqueeze(1)).squeeze(1)
-        
-    return spoofed_confidence_class_probs.item() , predicted_class.item()
+    spoofed_confidence_class_probs = softmax_probs[:,0]
+
+    return spoofed_confidence_class_probs, predicted_class
+
+
+def score_batch(x_inp):
+    """
+    Scores already decoded and padded inputs.
+    x_inp   :(#bs, #samp) float32, on any device
+    returns a list of (spoof probability, predicted class)
+    """
+    model = registry.get("AASIST")
+    x_inp = x_inp.to(registry.device)
+    spoof_probs, predicted_class = predict(model, x_inp)
+
+    return list(zip(spoof_probs.tolist(), predicted_class.tolist()))
 
     
 
@@ -5,69 +5,84 @@ import numpy as np
 import torch
 from torch import nn
 from torch import Tensor
-import librosa
 from importlib import import_module
 from typing import Dict, List, Union
 from aasist_utils import set_seed
+from model_registry import registry
+from models.quantization import quantize_dynamic, quantize_mode
+from model_export import existing_artifact, load_artifact
 
 
-def pad(x, max_len=64600):
-    x_len = x.shape[0]
-    if x_len >= max_len:
-        return x[:max_len]
-    # need to pad
-    num_repeats = int(max_len / x_len)+1
-    padded_x = np.tile(x, (1, num_repeats))[:, :max_len][0]
-    return padded_x 
+CONFIG_FILE = 'config/RawNet.conf'
+MODEL_PATH = 'models/weights/pre_trained_DF_RawNet2.pth'
 
-    
-    
-def rawnet_model(audio_path):
-    
-    config_file = 'config/RawNet.conf'
 
-    with open(config_file, "r") as f_json:
-        config = json.loads(f_json.read())
-        
+def weights_path(config: Dict) -> str:
+    """Path of the pretrained RawNet2 weights, or of the exported artifact"""
+    backend = config.get("backend", "eager")
+    if backend != "eager":
+        return existing_artifact("RawNet", backend, config.get("compiled_dir"))
+    return MODEL_PATH
+
+
+def build_model(config: Dict, device: torch.device):
+    """Builds RawNet from a loaded config and loads its pretrained weights"""
     model_config = config['model_config']
  
     # set_random_seed(1234)
     set_seed(1234, config)
-    
-    #GPU device
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    
+
+    # compiled backends load the artifact written by `spoofdetect export`
+    backend = config.get("backend", "eager")
+    if backend != "eager":
+        return load_artifact(weights_path(config), backend, device, config.get("quantize"))
+
     # model 
     model = get_model(model_config, device)
     model =(model).to(device)
     
-    
-    model_path = 'models/weights/pre_trained_DF_RawNet2.pth'
+    model_path = weights_path(config)
     
     if model_path:
         model.load_state_dict(torch.load(model_path,map_location=device))
         # print('Model loaded : {}'.format(model_path))
-        
-    if audio_path:
-        pass
-        # print('Audio loaded : {}'.format(audio_path))
-        
-    X,fs = librosa.load(audio_path, sr=16000) 
-    X_pad= pad(X,64600)
-    x_inp= Tensor(X_pad)
-    x_inp = x_inp.view(1, -1)
-    # Perform a forward pass on a single audio file
-
     model.eval()
-    x_inp = x_inp.to(device)
-    pred = model(x_inp)
+
+    # "quantize": "dynamic" runs the GRU and fully connected layers in int8 (CPU)
+    if quantize_mode(config, device) == "dynamic":
+        model = quantize_dynamic(model, {nn.GRU, nn.Linear})
+
+    return model
+
+
+registry.register("RawNet", CONFIG_FILE, build_model, weights_path)
+
+    
+def predict(model, x_inp):
+    """
+    x_inp   :(#bs, #samp)
+    returns spoof probabilities (#bs) and predicted classes (#bs)
+    """
+    with torch.no_grad():
+        pred = model(x_inp)
     softmax_probs = torch.softmax(pred, dim=1)
     _, predicted_class = torch.max(softmax_probs, 1)
-    spoofed_confidence_class_probs = softmax_probs[0,0]
-    # Get the softmax probability values of the predicted class
-    predicted_class_probs = softmax_probs.gather(1, predicted_class.unsqueeze(1)).squeeze(1)
+    spoofed_confidence_class_probs = softmax_probs[:,0]
+
+    return spoofed_confidence_class_probs, predicted_class
+
     
-    return spoofed_confidence_class_probs.item(), predicted_class.item()
+def score_batch(x_inp):
+    """
+    Scores already decoded and padded inputs.
+    x_inp   :(#bs, #samp) float32, on any device
+    returns a list of (spoof probability, predicted class)
+    """
+    model = registry.get("RawNet")
+    x_inp = x_inp.to(registry.device)
+    spoof_probs, predicted_class = predict(model, x_inp)
+
+    return list(zip(spoof_probs.tolist(), predicted_class.tolist()))
 
 
 
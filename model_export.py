@@ -0,0 +1,172 @@
+"""
+Frozen inference artifacts for the registered models.
+
+export() builds a model from its config and weights, folds BatchNorm into
+the convolution in front of it, and writes
+    <out_dir>/<name>.ts     TorchScript, traced and frozen
+    <out_dir>/<name>.onnx   ONNX (opset 17) with a dynamic batch axis
+Loading an artifact skips the Python model code entirely. The scoring
+backends ("backend" config key) load them back with load_artifact():
+    eager        the nn.Module built from models/
+    torchscript  <name>.ts through torch.jit
+    onnxruntime  <name>.onnx through onnxruntime (optional dependency)
+Artifacts are traced for a fixed nb_samp and on the export device. They
+are written to and loaded from the "compiled_dir" config key
+(models/compiled by default).
+"""
+
+import copy
+import os
+import warnings
+
+import torch
+from torch import nn
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from model_registry import registry
+
+BACKENDS = ("eager", "torchscript", "onnxruntime")
+COMPILED_DIR = "models/compiled"
+
+# export format -> file suffix, and the format each compiled backend loads
+FORMATS = {"torchscript": ".ts", "onnx": ".onnx"}
+BACKEND_FORMATS = {"torchscript": "torchscript", "onnxruntime": "onnx"}
+
+
+def artifact_path(name, backend, out_dir=None):
+    """Path of the artifact a compiled backend loads for a model, in out_dir (or COMPILED_DIR)"""
+    if backend not in BACKEND_FORMATS:
+        raise ValueError("unknown backend '{}', expected one of {}".format(backend, BACKENDS))
+    return os.path.join(out_dir or COMPILED_DIR, name + FORMATS[BACKEND_FORMATS[backend]])
+
+
+def existing_artifact(name, backend, out_dir=None):
+    """
+    artifact_path, checked to exist: the registry stamps and hashes it
+    before anything is loaded
+    """
+    path = artifact_path(name, backend, out_dir)
+    _check_artifact(path, backend)
+    return path
+
+
+def _check_artifact(path, backend):
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            "no {} artifact at {}, run `python -m spoofdetect export` first".format(backend, path))
+
+
+def fold_batchnorm(model):
+    """
+    Folds bn2 into conv1 in every residual block (conv1 -> bn2 in both
+    AASIST and RawNet). bn1 sits behind an activation and stays.
+    Returns the number of folded pairs.
+    """
+    folded = 0
+    for module in model.modules():
+        conv = getattr(module, "conv1", None)
+        bn = getattr(module, "bn2", None)
+        if isinstance(conv, nn.modules.conv._ConvNd) and isinstance(bn, _BatchNorm):
+            module.conv1 = fuse_conv_bn_eval(conv, bn)
+            module.bn2 = nn.Identity()
+            folded += 1
+    return folded
+
+
+class OnnxRuntimeModel:
+    """Runs an exported ONNX graph behind the eager model's call signature"""
+    def __init__(self, path, device):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        # follow torch's thread cap, so pool workers do not oversubscribe
+        options.intra_op_num_threads = torch.get_num_threads()
+        providers = ["CPUExecutionProvider"]
+        if torch.device(device).type == "cuda" and \
+                "CUDAExecutionProvider" in onnxruntime.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+
+        self.session = onnxruntime.InferenceSession(path, options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def eval(self):
+        return self
+
+    def __call__(self, x):
+        outputs = self.session.run(None, {self.input_name: x.detach().cpu().numpy()})
+        outputs = tuple(torch.from_numpy(out).to(x.device) for out in outputs)
+        return outputs[0] if len(outputs) == 1 else outputs
+
+
+def load_artifact(path, backend, device, quantize=None):
+    """
+    Loads an exported artifact as a callable model. Artifacts are fp32, a
+    "quantize" mode set for the model is ignored with a warning.
+    """
+    if quantize is not None:
+        warnings.warn("\"quantize\": \"{}\" is ignored by the {} backend, its artifacts are "
+                      "fp32; use the eager backend to quantize".format(quantize, backend))
+    _check_artifact(path, backend)
+    if backend == "torchscript":
+        return torch.jit.load(path, map_location=device).eval()
+    if backend == "onnxruntime":
+        return OnnxRuntimeModel(path, device)
+    raise ValueError("backend '{}' has no artifact".format(backend))
+
+
+def _max_diff(reference, output):
+    if isinstance(reference, tuple):
+        reference, output = reference[-1], output[-1]
+    return (reference - output).abs().max().item()
+
+
+def export(name, formats=("torchscript", "onnx"), out_dir=None, device=None):
+    """
+    Writes the artifacts of one registered model and checks them against
+    the eager model on a random batch of another size. out_dir defaults
+    to the model's "compiled_dir", where the compiled backends load from.
+    Returns {format: (path, max logit difference)}.
+    """
+    device = device or registry.device
+    config = copy.deepcopy(registry.get_config(name))
+    out_dir = out_dir or config.get("compiled_dir") or COMPILED_DIR
+    config["backend"] = "eager"
+    # artifacts are fp32, quantize the eager model instead
+    config["quantize"] = None
+    nb_samp = config["model_config"]["nb_samp"]
+
+    os.makedirs(out_dir, exist_ok=True)
+    example = torch.randn(2, nb_samp, device=device) * 0.1
+    check = torch.randn(3, nb_samp, device=device) * 0.1
+    with torch.no_grad():
+        reference = registry.build(name, config)(check)
+
+    exported = {}
+    for fmt in formats:
+        fmt_config = copy.deepcopy(config)
+        if fmt == "onnx":
+            # no FFT in ONNX graphs, the runtime has its own conv kernels
+            fmt_config["model_config"]["fft_threshold"] = None
+        model = registry.build(name, fmt_config)
+        fold_batchnorm(model)
+        path = os.path.join(out_dir, name + FORMATS[fmt])
+
+        with torch.no_grad(), warnings.catch_warnings():
+            # shapes are fixed by nb_samp, the tracer's shape warnings do not apply
+            warnings.simplefilter("ignore")
+            if fmt == "torchscript":
+                traced = torch.jit.freeze(torch.jit.trace(model, example, check_trace=False))
+                torch.jit.save(traced, path)
+            elif fmt == "onnx":
+                torch.onnx.export(model, (example,), path, dynamo=False, opset_version=17,
+                                  input_names=["x"], dynamic_axes={"x": {0: "batch"}})
+            else:
+                raise ValueError("unknown format '{}', expected one of {}".format(
+                    fmt, tuple(FORMATS)))
+
+            backend = "torchscript" if fmt == "torchscript" else "onnxruntime"
+            output = load_artifact(path, backend, device)(check)
+        exported[fmt] = (path, _max_diff(reference, output))
+
+    return exported
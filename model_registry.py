@@ -0,0 +1,192 @@
+"""
+Process-wide registry of the inference models.
+
+Each architecture is built, loaded and put in eval mode once, then handed
+out to every caller (GUI, folder loop, scripts). An entry is rebuilt when
+its config or weight file changes on disk.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+
+import torch
+
+
+def _file_stamp(path):
+    """Returns a cheap change marker (mtime, size) for a file."""
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ModelRegistry:
+    """Builds each registered model once and caches it per process"""
+    def __init__(self, device=None):
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = device
+        self._specs = {}
+        self._entries = {}
+        self._configs = {}
+        self._overrides = {}
+        self._file_hashes = {}
+        # bumped whenever a model must be rebuilt for reasons its files do not show
+        self._generations = {}
+        self._build_locks = {}
+        self._lock = threading.RLock()
+
+    def register(self, name, config_file, build_fn, weights_fn):
+        """
+        name        : key used by callers, e.g. "AASIST"
+        config_file : path to the JSON config
+        build_fn    : build_fn(config, device) -> model with weights loaded
+        weights_fn  : weights_fn(config) -> path of the weight file
+        """
+        with self._lock:
+            self._specs[name] = (config_file, build_fn, weights_fn)
+            self._drop(name)
+
+    def get(self, name):
+        """Returns the cached model, rebuilding it if its files changed."""
+        return self.get_entry(name)[0]
+
+    def get_config(self, name):
+        """Returns the current config of a registered model without building it."""
+        with self._lock:
+            return self._load_config(name)[1]
+
+    def set_overrides(self, name, **overrides):
+        """
+        Replaces top-level config keys of a model in this process only,
+        e.g. set_overrides("RawNet", backend="torchscript"). A None value
+        drops the override. The model is rebuilt on next use.
+        """
+        with self._lock:
+            current = self._overrides.setdefault(name, {})
+            for key, value in overrides.items():
+                if value is None:
+                    current.pop(key, None)
+                else:
+                    current[key] = value
+            self._drop(name)
+
+    def build(self, name, config=None):
+        """Builds a fresh, uncached model, from the current config by default."""
+        with self._lock:
+            if config is None:
+                config = self._load_config(name)[1]
+            build_fn = self._specs[name][1]
+        model = build_fn(copy.deepcopy(config), self.device)
+        model.eval()
+        return model
+
+    def identity(self, name):
+        """
+        Hex digest naming what a model computes: its name, its config and
+        the content of its weight file. Changes whenever either file does.
+        """
+        with self._lock:
+            _, config = self._load_config(name)
+            weights_file = self._specs[name][2](config)
+            description = json.dumps({
+                "name": name,
+                "config": config,
+                "weights": self._hash_file(weights_file),
+            }, sort_keys=True)
+            return hashlib.sha256(description.encode()).hexdigest()
+
+    def _hash_file(self, path):
+        """sha256 of a file, rehashed only when its stamp changes."""
+        stamp = _file_stamp(path)
+        cached = self._file_hashes.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f_weights:
+            for block in iter(lambda: f_weights.read(1 << 20), b""):
+                digest.update(block)
+        self._file_hashes[path] = (stamp, digest.hexdigest())
+        return self._file_hashes[path][1]
+
+    def _current(self, name):
+        """
+        (cached entry or None, stamp, config); the entry is up to date
+        when its stamp equals the returned one. Call with the lock held.
+        """
+        config_stamp, config = self._load_config(name)
+        weights_file = self._specs[name][2](config)
+        stamp = (self._generations.get(name, 0), config_stamp, _file_stamp(weights_file))
+        return self._entries.get(name), stamp, config
+
+    def get_entry(self, name):
+        """
+        Returns (model, config) for a registered model.
+        The build runs outside the registry lock, so other calls (configs,
+        identities, other models) do not wait for weights to load; a
+        per-model lock keeps two threads from building the same model.
+        """
+        while True:
+            with self._lock:
+                entry, stamp, config = self._current(name)
+                if entry is not None and entry["stamp"] == stamp:
+                    return entry["model"], entry["config"]
+                build_lock = self._build_locks.setdefault(name, threading.Lock())
+                build_fn = self._specs[name][1]
+
+            with build_lock:
+                with self._lock:
+                    # another thread may have built it while this one waited
+                    entry, stamp, config = self._current(name)
+                    if entry is not None and entry["stamp"] == stamp:
+                        return entry["model"], entry["config"]
+
+                # builders may edit the config in place (RawNet does), keep ours clean
+                model = build_fn(copy.deepcopy(config), self.device)
+                model.eval()
+
+                with self._lock:
+                    # the files or overrides may have changed during the build
+                    if self._current(name)[1] != stamp:
+                        continue
+                    self._entries[name] = {
+                        "model": model,
+                        "config": config,
+                        "stamp": stamp,
+                    }
+                    return model, config
+
+    def _load_config(self, name):
+        """Returns (stamp, config), rereading the file only when it changed."""
+        if name not in self._specs:
+            raise KeyError("model '{}' is not registered".format(name))
+        config_file = self._specs[name][0]
+
+        config_stamp = _file_stamp(config_file)
+        cached = self._configs.get(name)
+        if cached is not None and cached[0] == config_stamp:
+            return cached
+
+        with open(config_file, "r") as f_json:
+            config = json.loads(f_json.read())
+        config.update(self._overrides.get(name, {}))
+        self._configs[name] = (config_stamp, config)
+        return self._configs[name]
+
+    def _drop(self, name):
+        """Forgets a model and its config, also one being built. Call with the lock held."""
+        self._entries.pop(name, None)
+        self._configs.pop(name, None)
+        self._generations[name] = self._generations.get(name, 0) + 1
+
+    def invalidate(self, name=None):
+        """Drops one cached model, or all of them when name is None."""
+        with self._lock:
+            for dropped in (list(self._specs) if name is None else [name]):
+                self._drop(dropped)
+
+
+# shared by every caller in the process
+registry = ModelRegistry()
@@ -4,6 +4,7 @@ Copyright (c) 2021-present NAVER Corp.
 MIT license
 """
 
+import functools
 import random
 from typing import Union
 
@@ -13,6 +14,28 @@ import torch.nn as nn
 import torch.nn.functional as F
 from torch import Tensor
 
+from .fft_conv import FFT_KERNEL_THRESHOLD, FFTConv1d, use_fft
+
+
+# weight selections of the fused attention board kept, one per shape
+BOARD_INDEX_CACHE_SIZE = 32
+
+
+@functools.lru_cache(maxsize=BOARD_INDEX_CACHE_SIZE)
+def _board_index(row_start, nb_rows, nb_nodes, num_type1, device):
+    '''
+    Which stacked weight (0: 11, 1: 22, 2: 12) each node pair uses.
+    Built once per shape; only the last BOARD_INDEX_CACHE_SIZE shapes are kept.
+    out_shape   :(1, #rows, #node, 1)
+    '''
+    row_type2 = torch.arange(row_start, row_start + nb_rows,
+                             device=device) >= num_type1
+    col_type2 = torch.arange(nb_nodes, device=device) >= num_type1
+    same_type = row_type2.unsqueeze(1) == col_type2.unsqueeze(0)
+    index = torch.where(same_type, row_type2.long().unsqueeze(1),
+                        torch.full_like(same_type, 2, dtype=torch.long))
+    return index.view(1, nb_rows, nb_nodes, 1)
+
 
 class GraphAttentionLayer(nn.Module):
     def __init__(self, in_dim, out_dim, **kwargs):
@@ -40,6 +63,9 @@ class GraphAttentionLayer(nn.Module):
         if "temperature" in kwargs:
             self.temp = kwargs["temperature"]
 
+        # rows of the pairwise node tensor built at once (None: all of them)
+        self.att_chunk_size = kwargs.get("att_chunk_size")
+
     def forward(self, x):
         '''
         x   :(#bs, #node, #dim)
@@ -77,11 +103,14 @@ class GraphAttentionLayer(nn.Module):
         x           :(#bs, #node, #dim)
         out_shape   :(#bs, #node, #node, 1)
         '''
-        att_map = self._pairwise_mul_nodes(x)
-        # size: (#bs, #node, #node, #dim_out)
-        att_map = torch.tanh(self.att_proj(att_map))
-        # size: (#bs, #node, #node, 1)
-        att_map = torch.matmul(att_map, self.att_weight)
+        if self.att_chunk_size is None:
+            att_map = self._pairwise_mul_nodes(x)
+            # size: (#bs, #node, #node, #dim_out)
+            att_map = torch.tanh(self.att_proj(att_map))
+            # size: (#bs, #node, #node, 1)
+            att_map = torch.matmul(att_map, self.att_weight)
+        else:
+            att_map = self._derive_att_scores_chunked(x)
 
         # apply temperature
         att_map = att_map / self.temp
@@ -90,6 +119,24 @@ class GraphAttentionLayer(nn.Module):
 
         return att_map
 
+    def _derive_att_scores_chunked(self, x):
+        '''
+        Same scores as the full path, built att_chunk_size rows at a time so
+        the (#bs, #node, #node, #dim_out) tensor never exists at once.
+        x           :(#bs, #node, #dim)
+        out_shape   :(#bs, #node, #node, 1)
+        '''
+        nb_nodes = x.size(1)
+        att_map = x.new_empty(x.size(0), nb_nodes, nb_nodes, 1)
+        for start in range(0, nb_nodes, self.att_chunk_size):
+            end = min(start + self.att_chunk_size, nb_nodes)
+            # size: (#bs, #chunk, #node, #dim_out)
+            att_chunk = torch.tanh(self.att_proj(
+                _pairwise_mul_rows(x, start, end)))
+            att_map[:, start:end] = torch.matmul(att_chunk, self.att_weight)
+
+        return att_map
+
     def _project(self, x, att_map):
         x1 = self.proj_with_att(torch.matmul(att_map.squeeze(-1), x))
         x2 = self.proj_without_att(x)
@@ -110,6 +157,15 @@ class GraphAttentionLayer(nn.Module):
         return out
 
 
+def _pairwise_mul_rows(x, start, end):
+    '''
+    Pairwise multiplication of nodes start:end with every node.
+    x           :(#bs, #node, #dim)
+    out_shape   :(#bs, end - start, #node, #dim)
+    '''
+    return x[:, start:end].unsqueeze(2) * x.unsqueeze(1)
+
+
 class HtrgGraphAttentionLayer(nn.Module):
     def __init__(self, in_dim, out_dim, **kwargs):
         super().__init__()
@@ -147,6 +203,13 @@ class HtrgGraphAttentionLayer(nn.Module):
         if "temperature" in kwargs:
             self.temp = kwargs["temperature"]
 
+        # rows of the pairwise node tensor built at once (None: all of them)
+        self.att_chunk_size = kwargs.get("att_chunk_size")
+
+        # one stacked contraction for the type-pair weights at inference,
+        # equal to the four-block board to float32 rounding (<= ~1e-6)
+        self.fuse_att_board = kwargs.get("fuse_att_board", False)
+
     def forward(self, x1, x2, master=None):
         '''
         x1  :(#bs, #node, #dim)
@@ -227,23 +290,14 @@ class HtrgGraphAttentionLayer(nn.Module):
         x           :(#bs, #node, #dim)
         out_shape   :(#bs, #node, #node, 1)
         '''
-        att_map = self._pairwise_mul_nodes(x)
-        # size: (#bs, #node, #node, #dim_out)
-        att_map = torch.tanh(self.att_proj(att_map))
-        # size: (#bs, #node, #node, 1)
-
-        att_board = torch.zeros_like(att_map[:, :, :, 0]).unsqueeze(-1)
-
-        att_board[:, :num_type1, :num_type1, :] = torch.matmul(
-            att_map[:, :num_type1, :num_type1, :], self.att_weight11)
-        att_board[:, num_type1:, num_type1:, :] = torch.matmul(
-            att_map[:, num_type1:, num_type1:, :], self.att_weight22)
-        att_board[:, :num_type1, num_type1:, :] = torch.matmul(
-            att_map[:, :num_type1, num_type1:, :], self.att_weight12)
-        att_board[:, num_type1:, :num_type1, :] = torch.matmul(
-            att_map[:, num_type1:, :num_type1, :], self.att_weight12)
-
-        att_map = att_board
+        if self.att_chunk_size is None:
+            att_map = self._pairwise_mul_nodes(x)
+            # size: (#bs, #node, #node, #dim_out)
+            att_map = torch.tanh(self.att_proj(att_map))
+            # size: (#bs, #node, #node, 1)
+            att_map = self._att_board(att_map, 0, num_type1)
+        else:
+            att_map = self._derive_att_board_chunked(x, num_type1)
 
         # att_map = torch.matmul(att_map, self.att_weight12)
 
@@ -254,6 +308,70 @@ class HtrgGraphAttentionLayer(nn.Module):
 
         return att_map
 
+    def _att_board(self, att_map, row_start, num_type1):
+        '''
+        Applies the type-pair weights (11, 22, 12) to rows
+        row_start:row_start + #rows of the projected pairwise tensor.
+        att_map     :(#bs, #rows, #node, #dim_out)
+        out_shape   :(#bs, #rows, #node, 1)
+        '''
+        if self.fuse_att_board and not self.training:
+            return self._att_board_fused(att_map, row_start, num_type1)
+
+        # rows before k are type-1 nodes, the rest type-2
+        k = min(max(num_type1 - row_start, 0), att_map.size(1))
+
+        att_board = torch.zeros_like(att_map[:, :, :, 0]).unsqueeze(-1)
+
+        att_board[:, :k, :num_type1, :] = torch.matmul(
+            att_map[:, :k, :num_type1, :], self.att_weight11)
+        att_board[:, k:, num_type1:, :] = torch.matmul(
+            att_map[:, k:, num_type1:, :], self.att_weight22)
+        att_board[:, :k, num_type1:, :] = torch.matmul(
+            att_map[:, :k, num_type1:, :], self.att_weight12)
+        att_board[:, k:, :num_type1, :] = torch.matmul(
+            att_map[:, k:, :num_type1, :], self.att_weight12)
+
+        return att_board
+
+    def _att_board_fused(self, att_map, row_start, num_type1):
+        '''
+        Inference version of _att_board: one contraction against the three
+        stacked weights, then a gather picks the weight of each node pair.
+        Skips the zero board and the four strided writes. The contraction
+        runs as one gemm instead of four, so values match _att_board to
+        float32 rounding (up to ~1e-6), not bit for bit; only used when
+        "fused_att_board" is set in the model config.
+        att_map     :(#bs, #rows, #node, #dim_out)
+        out_shape   :(#bs, #rows, #node, 1)
+        '''
+        # size: (#bs, #rows, #node, 3) for weights 11, 22, 12
+        scores = torch.matmul(att_map, torch.cat(
+            [self.att_weight11, self.att_weight22, self.att_weight12], dim=1))
+        index = _board_index(row_start, att_map.size(1), att_map.size(2),
+                             num_type1, att_map.device)
+
+        return torch.gather(scores, -1,
+                            index.expand(att_map.size(0), -1, -1, -1))
+
+    def _derive_att_board_chunked(self, x, num_type1):
+        '''
+        Same board as the full path, built att_chunk_size rows at a time so
+        the (#bs, #node, #node, #dim_out) tensor never exists at once.
+        x           :(#bs, #node, #dim)
+        out_shape   :(#bs, #node, #node, 1)
+        '''
+        nb_nodes = x.size(1)
+        att_map = x.new_empty(x.size(0), nb_nodes, nb_nodes, 1)
+        for start in range(0, nb_nodes, self.att_chunk_size):
+            end = min(start + self.att_chunk_size, nb_nodes)
+            # size: (#bs, #chunk, #node, #dim_out)
+            att_chunk = torch.tanh(self.att_proj(
+                _pairwise_mul_rows(x, start, end)))
+            att_map[:, start:end] = self._att_board(att_chunk, start, num_type1)
+
+        return att_map
+
     def _project(self, x, att_map):
         x1 = self.proj_with_att(torch.matmul(att_map.squeeze(-1), x))
         x2 = self.proj_without_att(x)
@@ -341,7 +459,8 @@ class CONV(nn.Module):
                  dilation=1,
                  bias=False,
                  groups=1,
-                 mask=False):
+                 mask=False,
+                 fft_threshold=FFT_KERNEL_THRESHOLD):
         super().__init__()
         if in_channels != 1:
 
@@ -375,7 +494,7 @@ class CONV(nn.Module):
         self.mel = filbandwidthsf
         self.hsupp = torch.arange(-(self.kernel_size - 1) / 2,
                                   (self.kernel_size - 1) / 2 + 1)
-        self.band_pass = torch.zeros(self.out_channels, self.kernel_size)
+        band_pass = torch.zeros(self.out_channels, self.kernel_size)
         for i in range(len(self.mel) - 1):
             fmin = self.mel[i]
             fmax = self.mel[i + 1]
@@ -385,24 +504,38 @@ class CONV(nn.Module):
                 np.sinc(2*fmin*self.hsupp/self.sample_rate)
             hideal = hHigh - hLow
 
-            self.band_pass[i, :] = Tensor(np.hamming(
+            band_pass[i, :] = Tensor(np.hamming(
                 self.kernel_size)) * Tensor(hideal)
 
+        # fixed filters, pre-shaped for conv1d; the buffer follows the module
+        # to its device and is not part of the state dict
+        self.register_buffer("filters",
+                             band_pass.view(self.out_channels, 1,
+                                            self.kernel_size),
+                             persistent=False)
+
+        # long kernels are applied in the frequency domain (None disables)
+        self.fft_threshold = fft_threshold
+        self.fft_conv = FFTConv1d()
+
     def forward(self, x, mask=False):
-        band_pass_filter = self.band_pass.clone().to(x.device)
+        # inference reads the buffer as is: no copy and no state mutation,
+        # so one instance can be shared across threads
+        filters = self.filters
+        if (not mask and self.stride == 1 and self.padding == 0
+                and self.dilation == 1
+                and use_fft(self.kernel_size, x.device, self.fft_threshold)):
+            return self.fft_conv(x, filters)
         if mask:
+            # frequency masking works on a private copy
+            filters = filters.clone()
             A = np.random.uniform(0, 20)
             A = int(A)
-            A0 = random.randint(0, band_pass_filter.shape[0] - A)
-            band_pass_filter[A0:A0 + A, :] = 0
-        else:
-            band_pass_filter = band_pass_filter
-
-        self.filters = (band_pass_filter).view(self.out_channels, 1,
-                                               self.kernel_size)
+            A0 = random.randint(0, filters.shape[0] - A)
+            filters[A0:A0 + A, :] = 0
 
         return F.conv1d(x,
-                        self.filters,
+                        filters,
                         stride=self.stride,
                         padding=self.padding,
                         dilation=self.dilation,
@@ -478,7 +611,9 @@ class Model(nn.Module):
 
         self.conv_time = CONV(out_channels=filts[0],
                               kernel_size=d_args["first_conv"],
-                              in_channels=1)
+                              in_channels=1,
+                              fft_threshold=d_args.get("fft_threshold",
+                                                       FFT_KERNEL_THRESHOLD))
         self.first_bn = nn.BatchNorm2d(num_features=1)
 
         self.drop = nn.Dropout(0.5, inplace=True)
@@ -504,16 +639,19 @@ class Model(nn.Module):
                                                gat_dims[0],
                                                temperature=temperatures[1])
 
+        # "fused_att_board": true trades bit-exact scores (~1e-6 off) for a
+        # faster heterogeneous attention board, see _att_board_fused
+        fuse = d_args.get("fused_att_board", False)
         self.HtrgGAT_layer_ST11 = HtrgGraphAttentionLayer(
-            gat_dims[0], gat_dims[1], temperature=temperatures[2])
+            gat_dims[0], gat_dims[1], temperature=temperatures[2], fuse_att_board=fuse)
         self.HtrgGAT_layer_ST12 = HtrgGraphAttentionLayer(
-            gat_dims[1], gat_dims[1], temperature=temperatures[2])
+            gat_dims[1], gat_dims[1], temperature=temperatures[2], fuse_att_board=fuse)
 
         self.HtrgGAT_layer_ST21 = HtrgGraphAttentionLayer(
-            gat_dims[0], gat_dims[1], temperature=temperatures[2])
+            gat_dims[0], gat_dims[1], temperature=temperatures[2], fuse_att_board=fuse)
 
         self.HtrgGAT_layer_ST22 = HtrgGraphAttentionLayer(
-            gat_dims[1], gat_dims[1], temperature=temperatures[2])
+            gat_dims[1], gat_dims[1], temperature=temperatures[2], fuse_att_board=fuse)
 
         self.pool_S = GraphPool(pool_ratios[0], gat_dims[0], 0.3)
         self.pool_T = GraphPool(pool_ratios[1], gat_dims[0], 0.3)
@@ -525,6 +663,26 @@ class Model(nn.Module):
 
         self.out_layer = nn.Linear(5 * gat_dims[1], 2)
 
+        # memory-bounded attention, e.g. "gat_chunk_size": 8
+        self.set_gat_chunk_size(d_args.get("gat_chunk_size"))
+
+    def set_gat_chunk_size(self, chunk_size, layers=None):
+        """
+        Selects chunked (bounded memory) attention for the graph attention
+        layers. chunk_size is the number of node rows built at once, None
+        restores the full pairwise tensor. It can also be a dict mapping
+        layer names (e.g. "HtrgGAT_layer_ST11") to sizes. layers limits an
+        int chunk_size to the named layers.
+        """
+        for name, module in self.named_children():
+            if not isinstance(module, (GraphAttentionLayer,
+                                       HtrgGraphAttentionLayer)):
+                continue
+            if isinstance(chunk_size, dict):
+                module.att_chunk_size = chunk_size.get(name)
+            elif layers is None or name in layers:
+                module.att_chunk_size = chunk_size
+
     def forward(self, x, Freq_aug=False):
 
         x = x.unsqueeze(1)
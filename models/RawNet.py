@@ -7,6 +7,8 @@ from torch.utils import data
 from collections import OrderedDict
 from torch.nn.parameter import Parameter
 
+from .fft_conv import FFT_KERNEL_THRESHOLD, FFTConv1d, use_fft
+
 
 ___author__ = "Hemlata Tak"
 __email__ = "tak@eurecom.fr"
@@ -23,7 +25,8 @@ class SincConv(nn.Module):
 
 
     def __init__(self, device,out_channels, kernel_size,in_channels=1,sample_rate=16000,
-                 stride=1, padding=0, dilation=1, bias=False, groups=1):
+                 stride=1, padding=0, dilation=1, bias=False, groups=1,
+                 fft_threshold=FFT_KERNEL_THRESHOLD):
 
         super(SincConv,self).__init__()
 
@@ -61,24 +64,41 @@ class SincConv(nn.Module):
         filbandwidthsf=self.to_hz(filbandwidthsmel)  # Mel to Hz conversion
         self.mel=filbandwidthsf
         self.hsupp=torch.arange(-(self.kernel_size-1)/2, (self.kernel_size-1)/2+1)
-        self.band_pass=torch.zeros(self.out_channels,self.kernel_size)
-    
-       
+
+        # The filters are fixed (not learned): build them once and keep them
+        # as a buffer so they follow the module to its device. Not persistent,
+        # so pretrained state dicts still load as before.
+        self.register_buffer('filters', self.build_filters(), persistent=False)
+
+        # long kernels are applied in the frequency domain (None disables)
+        self.fft_threshold = fft_threshold
+        self.fft_conv = FFTConv1d()
+
+    def build_filters(self):
+        """
+        Vectorised band-pass filterbank build over all mel bands at once.
+        returns filters (out_channels, 1, kernel_size)
+        """
+        hsupp = self.hsupp.numpy().astype(np.float64)
+        fmin = self.mel[:-1, None]
+        fmax = self.mel[1:, None]
+        hHigh=(2*fmax/self.sample_rate)*np.sinc(2*fmax*hsupp/self.sample_rate)
+        hLow=(2*fmin/self.sample_rate)*np.sinc(2*fmin*hsupp/self.sample_rate)
+        hideal=hHigh-hLow
+
+        band_pass=np.hamming(self.kernel_size)*hideal
+        return torch.from_numpy(band_pass).float().view(self.out_channels, 1, self.kernel_size)
+
+    def rebuild_filters(self):
+        """Regenerates the cached filterbank in place, e.g. after changing self.mel"""
+        self.filters.copy_(self.build_filters())
+        self.fft_conv.clear()
         
     def forward(self,x):
-        for i in range(len(self.mel)-1):
-            fmin=self.mel[i]
-            fmax=self.mel[i+1]
-            hHigh=(2*fmax/self.sample_rate)*np.sinc(2*fmax*self.hsupp/self.sample_rate)
-            hLow=(2*fmin/self.sample_rate)*np.sinc(2*fmin*self.hsupp/self.sample_rate)
-            hideal=hHigh-hLow
-            
-            self.band_pass[i,:]=Tensor(np.hamming(self.kernel_size))*Tensor(hideal)
-        
-        band_pass_filter=self.band_pass.to(self.device)
+        if (self.stride == 1 and self.padding == 0 and self.dilation == 1
+                and use_fft(self.kernel_size, x.device, self.fft_threshold)):
+            return self.fft_conv(x, self.filters)
 
-        self.filters = (band_pass_filter).view(self.out_channels, 1, self.kernel_size)
-        
         return F.conv1d(x, self.filters, stride=self.stride,
                         padding=self.padding, dilation=self.dilation,
                          bias=None, groups=1)
@@ -154,7 +174,8 @@ class RawNet(nn.Module):
         self.Sinc_conv=SincConv(device=self.device,
 			out_channels = d_args['filts'][0],
 			kernel_size = d_args['first_conv'],
-                        in_channels = d_args['in_channels']
+                        in_channels = d_args['in_channels'],
+                        fft_threshold = d_args.get('fft_threshold', FFT_KERNEL_THRESHOLD)
         )
         
         self.first_bn = nn.BatchNorm1d(num_features = d_args['filts'][0])
@@ -252,7 +273,9 @@ class RawNet(nn.Module):
         x = self.bn_before_gru(x)
         x = self.selu(x)
         x = x.permute(0, 2, 1)     #(batch, filt, time) >> (batch, time, filt)
-        self.gru.flatten_parameters()
+        # the dynamic int8 GRU keeps packed weights and has no flatten_parameters
+        if hasattr(self.gru, 'flatten_parameters'):
+            self.gru.flatten_parameters()
         x, _ = self.gru(x)
         x = x[:,-1,:]
         # return x #in case of embediing calculation
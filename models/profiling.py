@@ -0,0 +1,152 @@
+"""
+Opt-in layer timing for the model forward passes.
+
+LayerProfiler attaches forward hooks to named submodules only inside its
+`with` block and removes them on exit, so models run exactly as before
+when it is not in use. While attached, it collects per module:
+    - wall time, inclusive and self (minus the profiled children),
+    - call count, and
+    - the size of the outputs.
+It can print a summary table and export a Chrome trace
+(chrome://tracing, https://ui.perfetto.dev).
+"""
+
+import json
+import os
+import threading
+import time
+
+import torch
+
+
+def _output_info(output):
+    """(bytes, shape of the first tensor) of a module output"""
+    tensors = []
+    if torch.is_tensor(output):
+        tensors = [output]
+    elif isinstance(output, (tuple, list)):
+        tensors = [t for t in output if torch.is_tensor(t)]
+    nbytes = sum(t.numel() * t.element_size() for t in tensors)
+    shape = list(tensors[0].shape) if tensors else None
+    return nbytes, shape
+
+
+class LayerProfiler:
+    """
+    model   : nn.Module to profile
+    names   : submodule names to hook (as in named_modules()), None picks
+              every submodule at most `depth` levels below the model
+    depth   : 1 = direct children, 2 = their children too, ...
+    label   : prefix of the names in the table and the trace (e.g. "AASIST")
+
+        with LayerProfiler(model, label="AASIST") as prof:
+            model(x)
+        print(prof.summary())
+        prof.export_chrome_trace("aasist_trace.json")
+    """
+    def __init__(self, model, names=None, depth=2, label=None):
+        self.model = model
+        self.label = label or type(model).__name__
+        modules = dict(model.named_modules())
+        if names is None:
+            names = [name for name in modules if name and name.count(".") < depth]
+        self.modules = {name: modules[name] for name in names}
+
+        self.stats = {}
+        self.events = []
+        self._handles = []
+        self._stack = threading.local()
+
+    def __enter__(self):
+        for name, module in self.modules.items():
+            self._handles.append(module.register_forward_pre_hook(self._pre_hook(name)))
+            self._handles.append(module.register_forward_hook(self._post_hook(name)))
+        # the whole forward, so shares are relative to it
+        self._handles.append(self.model.register_forward_pre_hook(self._pre_hook("")))
+        self._handles.append(self.model.register_forward_hook(self._post_hook("")))
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        return False
+
+    @staticmethod
+    def _sync(tensors):
+        if any(torch.is_tensor(t) and t.is_cuda for t in tensors):
+            torch.cuda.synchronize()
+
+    def _frames(self):
+        if not hasattr(self._stack, "frames"):
+            self._stack.frames = []
+        return self._stack.frames
+
+    def _pre_hook(self, name):
+        def hook(module, inputs):
+            self._sync(inputs)
+            # [name, start, time spent in profiled children]
+            self._frames().append([name, time.perf_counter(), 0.0])
+        return hook
+
+    def _post_hook(self, name):
+        def hook(module, inputs, output):
+            self._sync(output if isinstance(output, (tuple, list)) else (output,))
+            end = time.perf_counter()
+            frames = self._frames()
+            _, start, children = frames.pop()
+            duration = end - start
+            if frames:
+                frames[-1][2] += duration
+
+            nbytes, shape = _output_info(output)
+            stats = self.stats.setdefault(name, {
+                "calls": 0, "total": 0.0, "self": 0.0, "max": 0.0, "out_bytes": 0,
+                "out_shape": None, "type": type(module).__name__,
+            })
+            stats["calls"] += 1
+            stats["total"] += duration
+            stats["self"] += duration - children
+            stats["max"] = max(stats["max"], duration)
+            stats["out_bytes"] += nbytes
+            stats["out_shape"] = shape
+
+            self.events.append({
+                "name": self._full_name(name),
+                "cat": stats["type"],
+                "ph": "X",
+                # one clock for every profiler, so their traces line up
+                "ts": start * 1e6,
+                "dur": duration * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": {"output_shape": shape, "output_bytes": nbytes},
+            })
+        return hook
+
+    def _full_name(self, name):
+        return "{}.{}".format(self.label, name) if name else self.label
+
+    def summary(self, sort_by="total"):
+        """Table of the hooked modules, slowest first"""
+        forward = self.stats.get("", {}).get("total", 0.0) or 1e-12
+        rows = sorted(((name, stats) for name, stats in self.stats.items() if name),
+                      key=lambda item: item[1][sort_by], reverse=True)
+        lines = ["{:<36} {:<24} {:>6} {:>11} {:>10} {:>7} {:>11}  {}".format(
+            "module", "type", "calls", "total (ms)", "self (ms)", "share", "out (MB)", "last output")]
+        for name, stats in rows:
+            lines.append("{:<36} {:<24} {:>6} {:>11.2f} {:>10.2f} {:>6.1f}% {:>11.2f}  {}".format(
+                self._full_name(name), stats["type"], stats["calls"], stats["total"] * 1e3,
+                stats["self"] * 1e3, 100 * stats["total"] / forward,
+                stats["out_bytes"] / 2**20, stats["out_shape"]))
+        lines.append("{:<36} {:<24} {:>6} {:>11.2f}".format(
+            self.label, "forward", self.stats.get("", {}).get("calls", 0), forward * 1e3))
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, path, others=()):
+        """Writes this profiler's events (and those of `others`) as a Chrome trace"""
+        events = list(self.events)
+        for other in others:
+            events.extend(other.events)
+        with open(path, "w") as f_trace:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f_trace)
@@ -0,0 +1,59 @@
+"""
+Dynamic int8 quantization for CPU inference.
+
+Weights of the selected GRU/Linear modules are quantized to int8 once;
+activations are quantized on the fly per call, so no calibration data is
+needed and the pretrained fp32 checkpoints load unchanged before the swap.
+Quantized kernels only exist on CPU. The score drift against fp32 is
+reported by benchmarks/quantization.py.
+"""
+
+import io
+import warnings
+
+import torch
+
+# values accepted by the "quantize" config key
+QUANTIZE_MODES = (None, "dynamic")
+
+
+def quantize_mode(config, device):
+    """
+    Reads the "quantize" key of a model config (null/absent = fp32).
+    Falls back to fp32 with a warning when the model does not run on CPU.
+    """
+    mode = config.get("quantize")
+    if mode not in QUANTIZE_MODES:
+        raise ValueError("unknown quantize mode '{}', expected one of {}".format(
+            mode, QUANTIZE_MODES))
+    if mode is not None and torch.device(device).type != "cpu":
+        warnings.warn("int8 quantization is CPU only, running {} in fp32".format(device))
+        return None
+    return mode
+
+
+def quantize_dynamic(model, module_types, scopes=None):
+    """
+    Swaps module_types (e.g. {nn.GRU, nn.Linear}) for their dynamic int8
+    versions, in place. With scopes, only modules inside instances of those
+    types are swapped (e.g. the graph attention layers of AASIST).
+    """
+    with warnings.catch_warnings():
+        # torch.ao.quantization announces its move to torchao on every call
+        warnings.simplefilter("ignore")
+        if scopes is None:
+            torch.ao.quantization.quantize_dynamic(
+                model, set(module_types), dtype=torch.qint8, inplace=True)
+        else:
+            for module in list(model.modules()):
+                if isinstance(module, tuple(scopes)):
+                    torch.ao.quantization.quantize_dynamic(
+                        module, set(module_types), dtype=torch.qint8, inplace=True)
+    return model
+
+
+def state_dict_bytes(model):
+    """Serialized size of the model's state dict (packed int8 weights included)"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
@@ -0,0 +1,172 @@
+"""
+Multi-core scoring for large corpora.
+
+The file list is split into batches and spread over a pool of worker
+processes. Each worker keeps its own warm AASIST and RawNet instances and
+caps its intra-op threads, so the pool does not oversubscribe the CPU.
+Results come back in input order whatever order the workers finish in.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+import torch
+
+from model_registry import registry
+from scoring import cache_params, decoded_samples, score_files, score_or_skip, set_backend
+
+
+def _init_worker(threads_per_worker, backend, compiled_dir):
+    """Runs once in every worker process"""
+    set_backend(backend, compiled_dir)
+    torch.set_num_threads(threads_per_worker)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # already set by an earlier parallel region in this process
+        pass
+
+    # build both models up front so the first batch is not slower
+    registry.get("AASIST")
+    registry.get("RawNet")
+
+
+def _score_batch(audio_paths, batch_size, window_args, skip_errors):
+    """
+    returns (results, errors); with skip_errors, files that fail are left
+    out and listed in errors as (path, message), so nothing unpicklable
+    has to cross the process boundary
+    """
+    if not skip_errors:
+        return score_files(audio_paths, batch_size, **window_args), []
+    errors = []
+    report = lambda path, e: errors.append((path, str(e) or type(e).__name__))
+    return score_or_skip(audio_paths, report, batch_size, **window_args), errors
+
+
+def iter_scores_parallel(audio_paths: Iterable[str],
+                         workers: int = None,
+                         threads_per_worker: int = None,
+                         batch_size: int = None,
+                         backend: str = None,
+                         cache=None,
+                         compiled_dir: str = None,
+                         on_error=None,
+                         **window_args) -> Iterator[Dict]:
+    """
+    Yields one result dict per file, in input order.
+
+    workers             : worker processes, defaults to the CPU count
+    threads_per_worker  : torch intra-op threads per worker, defaults to
+                          an even share of the CPUs (at least 1)
+    batch_size          : files per task and per forward pass, None uses
+                          the AASIST config's "batch_size"
+    backend             : "eager", "torchscript" or "onnxruntime" in the
+                          workers, None uses the configs' "backend"
+    cache               : a score_cache.ScoreCache, looked up and filled in
+                          this process; its keys follow this process's
+                          configs, so set the same backend here
+    compiled_dir        : folder of the compiled backends' artifacts, None
+                          uses the configs' "compiled_dir"
+    on_error            : None stops at the first file that fails; otherwise
+                          it is called as on_error(path, error) in this
+                          process and the file is left out
+    window_args         : window/hop/aggregate/top_k for windowed scoring
+                          and the resample quality, see scoring.iter_scores
+    """
+    nb_cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = nb_cpus
+    if threads_per_worker is None:
+        threads_per_worker = max(1, nb_cpus // workers)
+    if batch_size is None:
+        batch_size = registry.get_config("AASIST")["batch_size"]
+
+    # spawn keeps Qt, CUDA and the parent's torch thread pools out of the workers
+    context = multiprocessing.get_context("spawn")
+    paths = iter(audio_paths)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(threads_per_worker, backend, compiled_dir)) as executor:
+        while True:
+            # keep every worker busy, with a bounded number of queued batches
+            while len(pending) < 2 * workers:
+                batch = list(islice(paths, batch_size))
+                if not batch:
+                    break
+                keys, results = [None] * len(batch), [None] * len(batch)
+                if cache is not None:
+                    params = cache_params(**window_args)
+                    keys, results = _cached(cache, cache.context(params), decoded_samples(params),
+                                            batch, on_error)
+                    batch = [path for path, key in zip(batch, keys) if key is not None]
+                    results = [result for result, key in zip(results, keys) if key is not None]
+                    keys = [key for key in keys if key is not None]
+                missing = [path for path, result in zip(batch, results) if result is None]
+                future = None
+                if missing:
+                    future = executor.submit(_score_batch, missing, batch_size, window_args,
+                                             on_error is not None)
+                pending.append((batch, keys, results, future))
+            if not pending:
+                return
+
+            batch, keys, results, future = pending.popleft()
+            scored, errors = future.result() if future is not None else ([], [])
+            for path, message in errors:
+                on_error(path, RuntimeError(message))
+            scored = iter(scored)
+            next_scored = None
+            for path, key, result in zip(batch, keys, results):
+                if result is None:
+                    if next_scored is None:
+                        next_scored = next(scored, None)
+                    if next_scored is None or next_scored["path"] != path:
+                        # failed in the worker, reported above
+                        continue
+                    result, next_scored = next_scored, None
+                    if cache is not None:
+                        cache.put(key, result)
+                yield result
+
+
+def _cached(cache, key_context, max_samples, batch, on_error):
+    """
+    Cache keys and cached results of a batch; a file whose key cannot be
+    computed (unreadable) gets None for both after on_error, or raises
+    """
+    keys, results = [], []
+    for path in batch:
+        try:
+            key = cache.key(path, key_context, max_samples)
+        except OSError as e:
+            if on_error is None:
+                raise
+            on_error(path, e)
+            keys.append(None)
+            results.append(None)
+            continue
+        keys.append(key)
+        results.append(cache.get(key, path))
+    return keys, results
+
+
+def score_files_parallel(audio_paths: Iterable[str],
+                         workers: int = None,
+                         threads_per_worker: int = None,
+                         batch_size: int = None,
+                         backend: str = None,
+                         cache=None,
+                         compiled_dir: str = None,
+                         on_error=None,
+                         **window_args) -> List[Dict]:
+    """Scores every file on a process pool, returns results in input order"""
+    return list(iter_scores_parallel(audio_paths, workers, threads_per_worker,
+                                     batch_size, backend, cache, compiled_dir, on_error,
+                                     **window_args))
@@ -0,0 +1,369 @@
+"""
+Writes scoring results to CSV, JSONL or Parquet as they come in.
+
+Scores are written as raw floats. Each row also carries the file's
+duration and the time it was scored, plus any run metadata passed in
+(model identities, backend). CSV and JSONL rows are flushed as they are
+written, so a killed run keeps every file scored so far. Parquet rows
+are buffered into row groups, each saved as a part file next to the
+output and merged into it on close(); it needs pyarrow.
+
+With append=True new rows go after the ones already in the file, and
+done_paths() lists the files already there, so a run can resume where
+it stopped. A line cut off by a crash is dropped before appending.
+"""
+
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+
+from audio_frontend import audio_duration
+
+FORMATS = ("csv", "jsonl", "parquet")
+EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl",
+              ".parquet": "parquet", ".pq": "parquet"}
+
+# result dict keys, then the per-file metadata added here
+RESULT_FIELDS = ["path", "filename", "a_spoof_confidence", "a_result",
+                 "r_spoof_confidence", "r_result", "oc_spoof_confidence", "final_score"]
+FILE_FIELDS = ["duration", "scored_at"]
+# per-window scores of windowed scoring, as JSON text in CSV and Parquet
+TIMELINE = "timeline"
+
+
+def format_for(path, fmt=None):
+    """The output format: `fmt`, else from the extension, else JSONL"""
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError("unknown format {!r}, use one of {}".format(fmt, ", ".join(FORMATS)))
+        return fmt
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "jsonl")
+
+
+def _timestamp(seconds=None):
+    """ISO 8601 UTC time, to the millisecond"""
+    moment = datetime.fromtimestamp(time.time() if seconds is None else seconds, timezone.utc)
+    return moment.isoformat(timespec="milliseconds")
+
+
+def _drop_partial_line(path):
+    """Cuts a text file back to its last complete line"""
+    with open(path, "rb+") as f_out:
+        f_out.seek(0, os.SEEK_END)
+        size = f_out.tell()
+        if size == 0:
+            return
+        f_out.seek(size - 1)
+        if f_out.read(1) == b"\n":
+            return
+        # walk back to the previous newline
+        end = size
+        while end > 0:
+            start = max(0, end - 64 * 1024)
+            f_out.seek(start)
+            newline = f_out.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                f_out.truncate(start + newline + 1)
+                return
+            end = start
+        f_out.truncate(0)
+
+
+class ResultWriter:
+    """
+    Base of the per-format writers, use open_writer().
+
+    path     : output file, "-" for stdout (CSV and JSONL only)
+    append   : keep the rows already in the file
+    metadata : columns with the same value on every row, e.g. model identities
+    """
+    def __init__(self, path, append=False, metadata=None):
+        self.path = path
+        self.append = append and path != "-" and os.path.exists(path)
+        self.metadata = dict(metadata or {})
+        self.nb_written = 0
+
+    def row(self, result):
+        """A result dict with the file and run metadata added"""
+        row = dict(result)
+        if "duration" not in row:
+            row["duration"] = audio_duration(row["path"])
+        scored_at = row.get("scored_at")
+        if not isinstance(scored_at, str):
+            row["scored_at"] = _timestamp(scored_at)
+        row.update(self.metadata)
+        return row
+
+    def write(self, result):
+        self._write(self.row(result))
+        self.nb_written += 1
+
+    def write_many(self, results):
+        for result in results:
+            self.write(result)
+
+    def done_paths(self):
+        """Paths of the files already in the output (empty unless appending)"""
+        return set(self._read_paths()) if self.append else set()
+
+    def flush(self):
+        """Makes the rows written so far durable (CSV and JSONL rows already are)"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class CsvWriter(ResultWriter):
+    def __init__(self, path, append=False, metadata=None):
+        super().__init__(path, append, metadata)
+        self.fields = RESULT_FIELDS + FILE_FIELDS + list(self.metadata) + [TIMELINE]
+        if self.append:
+            _drop_partial_line(path)
+            with open(path, "r", newline="") as f_in:
+                header = next(csv.reader(f_in), None)
+            # keep the columns of the existing file
+            if header:
+                self.fields = header
+            else:
+                self.append = False
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            self._file = open(path, "a" if self.append else "w", newline="")
+        self._writer = csv.DictWriter(self._file, self.fields, restval="",
+                                      extrasaction="ignore", lineterminator="\n")
+        if not self.append:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def _write(self, row):
+        if TIMELINE in row:
+            row[TIMELINE] = json.dumps(row[TIMELINE])
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def _read_paths(self):
+        with open(self.path, "r", newline="") as f_in:
+            for record in csv.DictReader(f_in):
+                if record.get("path") and record.get("final_score"):
+                    yield record["path"]
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class JsonlWriter(ResultWriter):
+    def __init__(self, path, append=False, metadata=None):
+        super().__init__(path, append, metadata)
+        if self.append:
+            _drop_partial_line(path)
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            self._file = open(path, "a" if self.append else "w")
+
+    def _write(self, row):
+        self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+
+    def _read_paths(self):
+        with open(self.path, "r") as f_in:
+            for line in f_in:
+                try:
+                    yield json.loads(line)["path"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetWriter(ResultWriter):
+    """
+    Rows are written in row groups of up to `row_group_size` rows, at
+    least every `flush_interval` seconds and on flush(). Each row group is
+    its own part file in a folder next to the output (path + ".parts") as
+    soon as it is written, so a killed run keeps every row up to the last
+    flush; close() merges the parts into the output. Opening the same
+    path with append=True picks up the parts a killed run left behind.
+    Every MAX_PARTS parts of the same size are merged into one, so a
+    long run keeps few files and each row is only rewritten a logarithmic
+    number of times.
+    """
+    MAX_PARTS = 64
+
+    def __init__(self, path, append=False, metadata=None, row_group_size=64 * 1024,
+                 flush_interval=30.0):
+        super().__init__(path, append, metadata)
+        if path == "-":
+            raise ValueError("Parquet output needs a file, not stdout")
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from None
+        self._pa, self._pq = pa, pq
+        self.row_group_size = row_group_size
+        self.flush_interval = flush_interval
+
+        types = {"path": pa.string(), "filename": pa.string(),
+                 "a_spoof_confidence": pa.float64(), "a_result": pa.int8(),
+                 "r_spoof_confidence": pa.float64(), "r_result": pa.int8(),
+                 "oc_spoof_confidence": pa.float64(), "final_score": pa.float64(),
+                 "duration": pa.float64(), "scored_at": pa.string()}
+        fields = [pa.field(name, types[name]) for name in RESULT_FIELDS + FILE_FIELDS]
+        fields += [pa.field(name, pa.string()) for name in self.metadata]
+        fields.append(pa.field(TIMELINE, pa.string()))
+        self.schema = pa.schema(fields)
+
+        self.parts_dir = path + ".parts"
+        self.append = append and (os.path.exists(path) or bool(self._parts()))
+        if not self.append:
+            # left by an earlier run whose output is being replaced; the old
+            # output goes now, as CSV and JSONL are truncated, so a resume of
+            # this run does not take its rows for done ones
+            if os.path.isdir(self.parts_dir):
+                shutil.rmtree(self.parts_dir)
+            if os.path.exists(path):
+                os.remove(path)
+        for existing in ([path] if os.path.exists(path) and self.append else []) + self._parts():
+            schema = pq.read_schema(existing)
+            if not schema.equals(self.schema):
+                raise ValueError("{} has other columns than this run writes: {}".format(
+                    existing, ", ".join(schema.names)))
+        os.makedirs(self.parts_dir, exist_ok=True)
+        parts = self._ranges()
+        self._next_part = parts[-1][1] + 1 if parts else 0
+        self._rows = []
+        self._since = None
+        self._closed = False
+
+    def _ranges(self):
+        """(first, last, path) of the part files, without ones a merge left behind"""
+        if not os.path.isdir(self.parts_dir):
+            return []
+        ranges = []
+        for name in os.listdir(self.parts_dir):
+            first, _, last = name[:-len(".parquet")].partition("-")
+            if name.endswith(".parquet") and first.isdigit() and last.isdigit():
+                ranges.append((int(first), int(last), os.path.join(self.parts_dir, name)))
+        # a merged part covers the parts it was made from: keep the widest
+        kept = []
+        for first, last, part in sorted(ranges, key=lambda r: (r[0], -r[1])):
+            if kept and last <= kept[-1][1]:
+                os.remove(part)
+            else:
+                kept.append((first, last, part))
+        return kept
+
+    def _parts(self):
+        return [part for _, _, part in self._ranges()]
+
+    def _write_tables(self, path, tables):
+        """Writes tables to a new file at `path`, joining small ones into full row groups"""
+        with self._pq.ParquetWriter(path + ".tmp", self.schema) as writer:
+            pending, nb_rows = [], 0
+            for table in tables:
+                pending.append(table)
+                nb_rows += table.num_rows
+                if nb_rows >= self.row_group_size:
+                    writer.write_table(self._pa.concat_tables(pending))
+                    pending, nb_rows = [], 0
+            if pending:
+                writer.write_table(self._pa.concat_tables(pending))
+        os.replace(path + ".tmp", path)
+
+    def _write_part(self, tables, first, last):
+        self._write_tables(os.path.join(self.parts_dir, "{:06d}-{:06d}.parquet".format(first, last)),
+                           tables)
+
+    def _write(self, row):
+        if TIMELINE in row:
+            row[TIMELINE] = json.dumps(row[TIMELINE])
+        for name in self.metadata:
+            row[name] = None if row[name] is None else str(row[name])
+        if not self._rows:
+            self._since = time.monotonic()
+        self._rows.append(row)
+        if (len(self._rows) >= self.row_group_size
+                or time.monotonic() - self._since >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered rows to a new part file"""
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows, schema=self.schema)
+        self._write_part([table], self._next_part, self._next_part)
+        self._next_part += 1
+        self._rows = []
+        self._compact()
+
+    def _level(self, first, last):
+        """Size class of a part: how many merges of MAX_PARTS parts made it"""
+        level, span = 0, last - first + 1
+        while span >= self.MAX_PARTS:
+            span //= self.MAX_PARTS
+            level += 1
+        return level
+
+    def _compact(self):
+        """Merges the newest parts while MAX_PARTS of them share a size class"""
+        while True:
+            parts = self._ranges()
+            if not parts:
+                return
+            level = self._level(*parts[-1][:2])
+            run = []
+            for first, last, part in reversed(parts):
+                if self._level(first, last) != level:
+                    break
+                run.insert(0, (first, last, part))
+            if len(run) < self.MAX_PARTS:
+                return
+            self._write_part(self._read_parts([part for _, _, part in run]),
+                             run[0][0], run[-1][1])
+            for _, _, part in run:
+                os.remove(part)
+
+    def _read_parts(self, paths):
+        for path in paths:
+            existing = self._pq.ParquetFile(path)
+            for index in range(existing.num_row_groups):
+                yield existing.read_row_group(index)
+
+    def _read_paths(self):
+        for path in ([self.path] if os.path.exists(self.path) else []) + self._parts():
+            yield from self._pq.read_table(path, columns=["path"]).column("path").to_pylist()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        sources = self._parts()
+        if self.append and os.path.exists(self.path):
+            sources.insert(0, self.path)
+        self._write_tables(self.path, self._read_parts(sources))
+        shutil.rmtree(self.parts_dir)
+        self._closed = True
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def open_writer(path, fmt=None, append=False, metadata=None):
+    """A ResultWriter for `path`, see ResultWriter for the arguments"""
+    return WRITERS[format_for(path, fmt)](path, append=append, metadata=metadata)
@@ -0,0 +1,204 @@
+"""
+Columnar store of scoring results, for the GUI results table.
+
+Scores live in NumPy arrays that grow by doubling and filenames in an
+interned list, so 100k results take a few MB rather than one Qt object
+per cell. Sorting and filtering work on whole columns and return the
+row numbers to show, in order.
+
+Filters combine clauses with "and" / "or" ("and" binds tighter):
+    final > 0.8
+    aasist >= 50% and rawnet < 0.3
+    name ~ LA_E or path ~ /incoming/
+    name ~ rock and roll
+A clause without an operator matches filenames containing it. Text
+values run up to the next clause with an operator, so they may contain
+"and" / "or"; they can also be quoted.
+"""
+
+import re
+import sys
+import time
+
+import numpy as np
+
+# score columns: name -> result dict key
+SCORES = {
+    "aasist": "a_spoof_confidence",
+    "rawnet": "r_spoof_confidence",
+    "oc": "oc_spoof_confidence",
+    "final": "final_score",
+}
+LABELS = {"a_result": "aasist", "r_result": "rawnet"}
+ALIASES = {"a": "aasist", "r": "rawnet", "one_class": "oc", "score": "final",
+           "filename": "name", "file": "name"}
+TEXT_COLUMNS = ("name", "path")
+
+_CLAUSE = re.compile(r"^(\w+)\s*(<=|>=|==|!=|<|>|~)\s*(.+)$")
+_OPERATORS = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+              "==": np.equal, "!=": np.not_equal}
+
+
+def _grow(column, size, capacity):
+    grown = np.zeros(capacity, dtype=column.dtype)
+    grown[:size] = column[:size]
+    return grown
+
+
+class ResultsStore:
+    """Append-only table of result dicts (as made by scoring.iter_scores)"""
+    def __init__(self, capacity=1024):
+        self.paths = []
+        self.filenames = []
+        self._scores = {name: np.zeros(capacity, dtype=np.float64) for name in SCORES}
+        self._labels = {name: np.zeros(capacity, dtype=np.int8) for name in LABELS}
+        # when each row arrived, in seconds since the epoch
+        self._times = np.zeros(capacity, dtype=np.float64)
+        # file lengths in seconds, NaN when unknown
+        self._durations = np.zeros(capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def extend(self, results):
+        """Appends result dicts; returns the row number of the first one"""
+        start = len(self.paths)
+        results = list(results)
+        needed = start + len(results)
+        capacity = self._scores["final"].shape[0]
+        if needed > capacity:
+            while capacity < needed:
+                capacity *= 2
+            for columns in (self._scores, self._labels):
+                for name, column in columns.items():
+                    columns[name] = _grow(column, start, capacity)
+            self._times = _grow(self._times, start, capacity)
+            self._durations = _grow(self._durations, start, capacity)
+
+        for name, key in SCORES.items():
+            self._scores[name][start:needed] = [result[key] for result in results]
+        for key, column in self._labels.items():
+            column[start:needed] = [result[key] for result in results]
+        self._times[start:needed] = time.time()
+        self._durations[start:needed] = [np.nan if result.get("duration") is None
+                                         else result["duration"] for result in results]
+        for result in results:
+            self.paths.append(sys.intern(result["path"]))
+            self.filenames.append(sys.intern(result["filename"]))
+        return start
+
+    def column(self, name):
+        """Scores of every row, as a read-only view"""
+        column = self._scores[ALIASES.get(name, name)][:len(self.paths)]
+        column.flags.writeable = False
+        return column
+
+    def result(self, row):
+        """Row `row` as a result dict"""
+        result = {"path": self.paths[row], "filename": self.filenames[row]}
+        for name, key in SCORES.items():
+            result[key] = float(self._scores[name][row])
+        for key, column in self._labels.items():
+            result[key] = int(column[row])
+        duration = float(self._durations[row])
+        result["duration"] = None if np.isnan(duration) else duration
+        result["scored_at"] = float(self._times[row])
+        return result
+
+    def _text(self, name, rows):
+        values = self.filenames if name == "name" else self.paths
+        return np.array([values[row] for row in rows], dtype=str)
+
+    def select(self, query=None, sort=None, descending=False, start=0):
+        """
+        Row numbers from `start` on that match `query` (see parse_filter),
+        ordered by the `sort` column (None keeps arrival order)
+        """
+        rows = np.arange(start, len(self.paths))
+        if query:
+            rows = rows[parse_filter(query)(self, rows)]
+        if sort is not None:
+            sort = ALIASES.get(sort, sort)
+            keys = self._text(sort, rows) if sort in TEXT_COLUMNS else self.column(sort)[rows]
+            if descending:
+                # negated ranks rather than a reversed sort, so ties stay in arrival order
+                keys = -(np.unique(keys, return_inverse=True)[1] if keys.dtype.kind == "U" else keys)
+            rows = rows[np.argsort(keys, kind="stable")]
+        return rows
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def _is_score_clause(clause):
+    match = _CLAUSE.match(clause)
+    return match is not None and ALIASES.get(match.group(1).lower(), match.group(1).lower()) in SCORES
+
+
+def _parse_clause(clause):
+    match = _CLAUSE.match(clause)
+    if match is None:
+        needle = _unquote(clause).lower()
+        return lambda store, rows: np.char.find(np.char.lower(store._text("name", rows)), needle) >= 0
+
+    name, operator, value = match.groups()
+    name = ALIASES.get(name.lower(), name.lower())
+    if name in TEXT_COLUMNS:
+        needle = _unquote(value).lower()
+        if operator == "~":
+            return lambda store, rows: np.char.find(np.char.lower(store._text(name, rows)), needle) >= 0
+        if operator in ("==", "!="):
+            compare = _OPERATORS[operator]
+            return lambda store, rows: compare(np.char.lower(store._text(name, rows)), needle)
+        raise ValueError("{} only supports ~, == and !=".format(name))
+
+    if name not in SCORES:
+        raise ValueError("unknown column {!r}, use one of {}".format(
+            name, ", ".join(list(SCORES) + list(TEXT_COLUMNS))))
+    if operator == "~":
+        raise ValueError("~ only applies to name and path")
+    value = value.strip()
+    scale = 1.0
+    if value.endswith("%"):
+        value, scale = value[:-1], 0.01
+    try:
+        threshold = float(value) * scale
+    except ValueError:
+        raise ValueError("{!r} is not a number".format(value)) from None
+    compare = _OPERATORS[operator]
+    return lambda store, rows: compare(store.column(name)[rows], threshold)
+
+
+def parse_filter(query):
+    """
+    Compiles a filter string to fn(store, rows) -> boolean mask over rows.
+    Raises ValueError on a malformed filter.
+    """
+    # [[clause, ...], ...]: "or" of "and"s. A piece that does not start a
+    # clause with an operator continues the text value before it.
+    pieces = re.split(r"\s+(and|or)\s+", query.strip(), flags=re.IGNORECASE)
+    groups = [[pieces[0]]]
+    for joiner, piece in zip(pieces[1::2], pieces[2::2]):
+        if _CLAUSE.match(piece) is None and not _is_score_clause(groups[-1][-1]):
+            groups[-1][-1] += " {} {}".format(joiner, piece)
+        elif joiner.lower() == "or":
+            groups.append([piece])
+        else:
+            groups[-1].append(piece)
+    groups = [[_parse_clause(clause.strip()) for clause in group if clause.strip()]
+              for group in groups]
+    groups = [clauses for clauses in groups if clauses]
+
+    def mask(store, rows):
+        selected = np.zeros(len(rows), dtype=bool)
+        for clauses in groups:
+            matched = np.ones(len(rows), dtype=bool)
+            for clause in clauses:
+                matched &= clause(store, rows)
+            selected |= matched
+        return selected if groups else np.ones(len(rows), dtype=bool)
+    return mask
@@ -0,0 +1,222 @@
+"""
+Persistent, content-addressed cache of scoring results.
+
+A result is stored under a key made of
+    - a hash of the bytes of the audio file that decoding reads: the
+      header and the scored frames of a PCM WAV in truncating mode, the
+      whole file otherwise (renamed files and copies still hit),
+    - the identity of both models (name, config, weight file hash), and
+    - the preprocessing parameters (sample rate, input length, windowing).
+Changing a config or weight file changes the key, so stale entries are
+never returned; they age out through the size-based LRU eviction.
+The hash of each file is remembered under its device, inode, size,
+mtime and ctime, so an unchanged file is not read again on the next scan.
+Eviction also drops the remembered hashes no stored result uses; these
+rows (about 100 bytes each) do not count towards max_bytes, which bounds
+the result payloads.
+The cache is a single SQLite file in the user cache directory.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from audio_frontend import decoded_bytes
+from model_registry import registry
+
+APP_NAME = "SpoofedSpeechGUI"
+DEFAULT_MAX_BYTES = 256 * 2**20
+# eviction trims the cache to this fraction of max_bytes
+EVICT_TO = 0.9
+# bytes read at a time when hashing an audio file
+HASH_BLOCK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    key         TEXT PRIMARY KEY,
+    payload     TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    last_used   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used);
+CREATE TABLE IF NOT EXISTS digests (
+    dev         INTEGER NOT NULL,
+    inode       INTEGER NOT NULL,
+    max_samples INTEGER NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL,
+    ctime_ns    INTEGER NOT NULL,
+    digest      TEXT NOT NULL,
+    PRIMARY KEY (dev, inode, max_samples)
+);
+"""
+
+
+def user_cache_dir():
+    """Per-user cache directory of the app"""
+    try:
+        from platformdirs import user_cache_dir as _user_cache_dir
+        return _user_cache_dir(APP_NAME)
+    except ImportError:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+        return os.path.join(base, APP_NAME)
+
+
+def default_cache_path():
+    return os.path.join(user_cache_dir(), "scores.sqlite")
+
+
+def hash_audio(path, max_samples=None):
+    """
+    Hash of the file size and of the bytes that load_audio reads when
+    keeping max_samples samples (None: the whole file), see
+    audio_frontend.decoded_bytes
+    """
+    size = os.stat(path).st_size
+    remaining = decoded_bytes(path, max_samples)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(size).encode())
+    with open(path, "rb") as f_audio:
+        while remaining is None or remaining > 0:
+            block = f_audio.read(HASH_BLOCK if remaining is None
+                                 else min(HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if remaining is not None:
+                remaining -= len(block)
+    return digest.hexdigest()
+
+
+class ScoreCache:
+    """
+    Maps (audio content, models, preprocessing) to a result dict.
+    Safe to share between threads; each process should open its own.
+    """
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM scores").fetchone()[0]
+
+    def context(self, params):
+        """
+        Key prefix for the current models and the given preprocessing
+        parameters. Compute it once per batch, it stats the model files.
+        """
+        description = json.dumps({
+            "models": {name: registry.identity(name) for name in ("AASIST", "RawNet")},
+            "params": params,
+        }, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def key(self, audio_path, context, max_samples=None):
+        """
+        Key of a file scored on its first max_samples samples, None for
+        windowed scoring of the whole file
+        """
+        return "{}:{}".format(self.content_hash(audio_path, max_samples), context)
+
+    def content_hash(self, audio_path, max_samples=None):
+        """
+        hash_audio of the file, read again only when its device, inode,
+        size, mtime or ctime changed since it was last hashed
+        """
+        st = os.stat(audio_path)
+        extent = -1 if max_samples is None else max_samples
+        stamp = (st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, ctime_ns, digest FROM digests "
+                "WHERE dev = ? AND inode = ? AND max_samples = ?",
+                (st.st_dev, st.st_ino, extent)).fetchone()
+        if row is not None and tuple(row[:3]) == stamp:
+            return row[3]
+
+        digest = hash_audio(audio_path, max_samples)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digests "
+                "(dev, inode, max_samples, size, mtime_ns, ctime_ns, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (st.st_dev, st.st_ino, extent) + stamp + (digest,))
+        return digest
+
+    def get(self, key, audio_path):
+        """Returns the cached result relabelled for audio_path, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM scores WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE scores SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        result = {
+            "path": audio_path,
+            "filename": os.path.basename(audio_path),
+        }
+        result.update(json.loads(row[0]))
+        return result
+
+    def put(self, key, result):
+        """Stores a result without its path/filename, then evicts if needed"""
+        payload = json.dumps({name: value for name, value in result.items()
+                              if name not in ("path", "filename")})
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM scores WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scores (key, payload, size, last_used) "
+                "VALUES (?, ?, ?, ?)", (key, payload, len(payload), time.time()))
+            self._total += len(payload) - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict(int(self.max_bytes * EVICT_TO))
+
+    def _evict(self, target):
+        """
+        Drops least recently used entries until the payloads fit in target,
+        and the remembered hashes of files no entry is left for
+        """
+        rows = self._conn.execute(
+            "SELECT key, size FROM scores ORDER BY last_used").fetchall()
+        stale = []
+        for key, size in rows:
+            if self._total <= target:
+                break
+            stale.append((key,))
+            self._total -= size
+        self._conn.execute("BEGIN")
+        self._conn.executemany("DELETE FROM scores WHERE key = ?", stale)
+        # keys are "<digest>:<context>", ';' sorts right after ':'
+        self._conn.execute(
+            "DELETE FROM digests WHERE NOT EXISTS (SELECT 1 FROM scores "
+            "WHERE key >= digest || ':' AND key < digest || ';')")
+        self._conn.execute("COMMIT")
+
+    def stats(self):
+        """(number of entries, payload bytes)"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+            return count, self._total
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM scores")
+            self._conn.execute("DELETE FROM digests")
+            self._total = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,408 @@
+"""
+Batched multi-file scoring with AASIST and RawNet.
+
+Each file is decoded once by audio_frontend and the same padded buffer is
+fed to both models. By default only the first nb_samp samples of a file
+are scored; windowed mode slides over the whole recording instead.
+"""
+
+import os
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+import torch
+
+import audio_frontend
+import main_aasist
+import main_rawnet
+from audio_frontend import RESAMPLE_QUALITIES, SAMPLE_RATE, load_audio, pad, prepare_input
+from model_registry import registry
+
+
+def _make_result(file_path, a_score, r_score):
+    a_spoof_confidence, a_result = a_score
+    r_spoof_confidence, r_result = r_score
+    return {
+        "path": file_path,
+        "filename": os.path.basename(file_path),
+        "a_spoof_confidence": a_spoof_confidence,
+        "a_result": a_result,
+        "r_spoof_confidence": r_spoof_confidence,
+        "r_result": r_result,
+        # One-Class model is not trained yet
+        "oc_spoof_confidence": 0,
+        # Average score of the two active models
+        "final_score": (a_spoof_confidence + r_spoof_confidence) / 2,
+    }
+
+
+def score_waveforms(audio_paths: List[str], waveforms: List[np.ndarray],
+                    durations: List[float] = None) -> List[Dict]:
+    """
+    Scores already decoded 16 kHz mono waveforms with both models in one
+    forward pass each. audio_paths only label the results; durations
+    (seconds, of the whole files) are added to them when given.
+    """
+    nb_samp = registry.get_config("AASIST")["model_config"]["nb_samp"]
+    x_inp = torch.from_numpy(
+        np.stack([prepare_input(waveform, nb_samp) for waveform in waveforms]))
+
+    a_scores = main_aasist.score_batch(x_inp)
+    r_scores = main_rawnet.score_batch(x_inp)
+
+    results = [_make_result(file_path, a_score, r_score)
+               for file_path, a_score, r_score in zip(audio_paths, a_scores, r_scores)]
+    if durations is not None:
+        for result, duration in zip(results, durations):
+            result["duration"] = duration
+    return results
+
+
+AGGREGATIONS = ("mean", "max", "topk")
+# shortest window both models accept, with a margin (AASIST's pooling fails below ~0.2 s)
+MIN_WINDOW = SAMPLE_RATE // 4
+
+
+def window_lengths(window: int = None, hop: int = None):
+    """
+    (window, hop) in samples with the defaults filled in: the model
+    nb_samp and half a window. Raises ValueError unless the window is at
+    least MIN_WINDOW and 0 < hop <= window, so no audio is skipped.
+    """
+    if window is None:
+        window = registry.get_config("AASIST")["model_config"]["nb_samp"]
+    if window < MIN_WINDOW:
+        raise ValueError("window of {} samples ({:g} s) is too short, the models need at "
+                         "least {} ({:g} s)".format(window, window / SAMPLE_RATE,
+                                                   MIN_WINDOW, MIN_WINDOW / SAMPLE_RATE))
+    if hop is None:
+        hop = window // 2
+    if not 0 < hop <= window:
+        raise ValueError("hop of {} samples ({:g} s) must be positive and at most the window "
+                         "({} samples, {:g} s)".format(hop, hop / SAMPLE_RATE,
+                                                      window, window / SAMPLE_RATE))
+    return window, hop
+
+
+def check_window_backend(window: int = None, backend: str = None):
+    """
+    Raises ValueError when a compiled backend (backend, None uses the
+    AASIST config's "backend") would get windows of other than nb_samp
+    samples: the artifacts are traced for that input length
+    """
+    config = registry.get_config("AASIST")
+    nb_samp = config["model_config"]["nb_samp"]
+    backend = backend or config.get("backend", "eager")
+    if window is not None and window != nb_samp and backend != "eager":
+        raise ValueError("compiled backends are traced for {} samples, "
+                         "use the eager backend for other window lengths".format(nb_samp))
+
+
+def frame_windows(waveform: np.ndarray, window: int, hop: int, max_batch: int):
+    """
+    Cuts a waveform into overlapping windows.
+    A last window aligned to the end of the file is added when the hop
+    does not land there, so the tail is always covered. Files shorter than
+    one window are padded the same way as in truncating mode.
+
+    returns the start sample of each window, and an iterator over the
+    windows as contiguous (#win, window) batches of at most max_batch;
+    only the batch being scored is copied out of the waveform
+    """
+    if waveform.shape[0] <= window:
+        return [0], iter([torch.from_numpy(pad(waveform, window)).unsqueeze(0)])
+
+    x = torch.from_numpy(waveform)
+    frames = x.unfold(0, window, hop)
+    starts = list(range(0, frames.shape[0] * hop, hop))
+    tail = None
+    if starts[-1] + window < x.shape[0]:
+        tail = x[-window:].unsqueeze(0)
+        starts.append(x.shape[0] - window)
+
+    def batches():
+        for first in range(0, len(starts), max_batch):
+            batch = frames[first:first + max_batch]
+            if tail is not None and first + max_batch >= len(starts):
+                batch = torch.cat([batch, tail])
+            yield batch.contiguous()
+
+    return starts, batches()
+
+
+def aggregate_scores(scores: np.ndarray, aggregate: str = "mean", top_k: int = 3) -> float:
+    """Combines per-window spoof probabilities into one file score"""
+    if aggregate == "mean":
+        return float(scores.mean())
+    if aggregate == "max":
+        return float(scores.max())
+    if aggregate == "topk":
+        if top_k < 1:
+            raise ValueError("top_k must be at least 1, got {}".format(top_k))
+        k = min(top_k, scores.shape[0])
+        return float(np.sort(scores)[-k:].mean())
+    raise ValueError("unknown aggregation '{}', expected one of {}".format(
+        aggregate, AGGREGATIONS))
+
+
+def score_windows(file_path: str,
+                  waveform: np.ndarray,
+                  window: int = None,
+                  hop: int = None,
+                  aggregate: str = "mean",
+                  top_k: int = 3,
+                  max_batch: int = None) -> Dict:
+    """
+    Scores the whole recording with a sliding window.
+
+    window      : window length in samples, None uses the model nb_samp
+    hop         : hop in samples, None uses half a window
+    aggregate   : "mean", "max" or "topk" (mean of the top_k windows)
+    max_batch   : windows per forward pass, bounds memory on long
+                  recordings; None uses the AASIST config's "batch_size"
+
+    returns the usual result dict plus a "timeline" of per-window scores
+    """
+    window, hop = window_lengths(window, hop)
+    if max_batch is None:
+        max_batch = registry.get_config("AASIST")["batch_size"]
+    starts, batches = frame_windows(waveform, window, hop, max_batch)
+
+    a_scores, r_scores = [], []
+    for x_inp in batches:
+        a_scores.extend(main_aasist.score_batch(x_inp))
+        r_scores.extend(main_rawnet.score_batch(x_inp))
+    a_probs = np.array([score for score, _ in a_scores])
+    r_probs = np.array([score for score, _ in r_scores])
+
+    a_spoof_confidence = aggregate_scores(a_probs, aggregate, top_k)
+    r_spoof_confidence = aggregate_scores(r_probs, aggregate, top_k)
+    # class 0 is spoof, as in the models' argmax
+    result = _make_result(file_path,
+                          (a_spoof_confidence, int(a_spoof_confidence < 0.5)),
+                          (r_spoof_confidence, int(r_spoof_confidence < 0.5)))
+    result["duration"] = waveform.shape[0] / SAMPLE_RATE
+    result["timeline"] = [{
+        "start": start / SAMPLE_RATE,
+        "end": min(start + window, waveform.shape[0]) / SAMPLE_RATE,
+        "a_spoof_confidence": float(a_prob),
+        "r_spoof_confidence": float(r_prob),
+    } for start, a_prob, r_prob in zip(starts, a_probs, r_probs)]
+
+    return result
+
+
+# cached mode reads ahead at most this many batches looking for misses
+CACHE_LOOKAHEAD = 4
+
+
+def resample_quality(quality: str = None) -> str:
+    """
+    The resampling quality to use: `quality`, else the AASIST config's
+    "resample_quality", else audio_frontend.RESAMPLE_QUALITY. Both models
+    share one decoded input, so the key is only read from AASIST.conf.
+    """
+    quality = (quality or registry.get_config("AASIST").get("resample_quality")
+               or audio_frontend.RESAMPLE_QUALITY)
+    if quality not in RESAMPLE_QUALITIES:
+        raise ValueError("unknown resample quality '{}', expected one of {}".format(
+            quality, ", ".join(RESAMPLE_QUALITIES)))
+    return quality
+
+
+def cache_params(window: int = None, hop: int = None,
+                 aggregate: str = None, top_k: int = 3, quality: str = None) -> Dict:
+    """Preprocessing settings that change the results, as cache key input"""
+    nb_samp = registry.get_config("AASIST")["model_config"]["nb_samp"]
+    params = {"sample_rate": SAMPLE_RATE, "nb_samp": nb_samp,
+              "resampler": resample_quality(quality)}
+    if window is not None or hop is not None or aggregate is not None:
+        # resolve the defaults the way score_windows does
+        window, hop = window_lengths(window, hop)
+        aggregate = aggregate or "mean"
+        params.update(window=window, hop=hop, aggregate=aggregate,
+                      top_k=top_k if aggregate == "topk" else None)
+    return params
+
+
+def decoded_samples(params: Dict):
+    """
+    Samples decoded per file under cache_params(...) params: the model
+    input length in truncating mode, None (the whole file) when windowed
+    """
+    return None if "window" in params else params["nb_samp"]
+
+
+def _iter_cached(audio_paths, cache, batch_size, window_args, on_error=None):
+    """
+    iter_scores through a ScoreCache: hits are returned without decoding,
+    misses are grouped into full batches, scored and stored.
+    """
+    group = batch_size or registry.get_config("AASIST")["batch_size"]
+    paths = iter(audio_paths)
+    while True:
+        params = cache_params(**window_args)
+        context = cache.context(params)
+        max_samples = decoded_samples(params)
+        chunk = []
+        nb_missing = 0
+        for path in paths:
+            try:
+                key = cache.key(path, context, max_samples)
+            except OSError as e:
+                if on_error is None:
+                    raise
+                on_error(path, e)
+                continue
+            result = cache.get(key, path)
+            chunk.append((path, key, result))
+            nb_missing += result is None
+            if nb_missing >= group or len(chunk) >= CACHE_LOOKAHEAD * group:
+                break
+        if not chunk:
+            return
+
+        missing = [path for path, _, result in chunk if result is None]
+        scored = iter_scores(missing, batch_size, on_error=on_error, **window_args)
+        pending = None
+        for path, key, result in chunk:
+            if result is None:
+                if pending is None:
+                    pending = next(scored, None)
+                if pending is None or pending["path"] != path:
+                    # skipped, already passed to on_error
+                    continue
+                result, pending = pending, None
+                cache.put(key, result)
+            yield result
+
+
+def iter_scores(audio_paths: Iterable[str], batch_size: int = None,
+                window: int = None, hop: int = None,
+                aggregate: str = None, top_k: int = 3,
+                cache=None, quality: str = None, on_error=None) -> Iterator[Dict]:
+    """
+    Yields one result dict per file, in input order, as soon as the batch
+    holding that file has been scored. Paths are consumed lazily.
+
+    batch_size  : files per forward pass; None uses the AASIST config's
+                  "batch_size". In windowed mode, windows per forward pass
+    window, hop, aggregate, top_k
+                : setting any of window/hop/aggregate switches to
+                  full-length windowed scoring, see score_windows
+    cache       : a score_cache.ScoreCache; files scored before with the
+                  same models and settings are not decoded again
+    quality     : resampling quality, "fast", "high" or "best"; None uses
+                  the AASIST config's "resample_quality", see resample_quality
+    on_error    : None stops at the first file that cannot be decoded or
+                  scored; otherwise such a file is passed to
+                  on_error(path, error) and left out of the results
+    """
+    quality = resample_quality(quality)
+    # before any file is decoded
+    check_window_backend(window)
+    if cache is not None:
+        yield from _iter_cached(audio_paths, cache, batch_size,
+                                dict(window=window, hop=hop, aggregate=aggregate, top_k=top_k,
+                                     quality=quality), on_error)
+        return
+
+    if window is not None or hop is not None or aggregate is not None:
+        for path in audio_paths:
+            try:
+                result = score_windows(path, load_audio(path, quality=quality), window, hop,
+                                       aggregate or "mean", top_k, batch_size)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(path, e)
+                continue
+            yield result
+        return
+
+    if batch_size is None:
+        batch_size = registry.get_config("AASIST")["batch_size"]
+
+    # only the first nb_samp samples reach the models, so only they are decoded
+    nb_samp = registry.get_config("AASIST")["model_config"]["nb_samp"]
+    paths = iter(audio_paths)
+    while True:
+        chunk = list(islice(paths, batch_size))
+        if not chunk:
+            return
+        if on_error is None:
+            loaded = [(path,) + load_audio(path, quality=quality, max_samples=nb_samp,
+                                           with_duration=True)
+                      for path in chunk]
+            yield from _score_loaded(loaded)
+            continue
+
+        loaded = []
+        for path in chunk:
+            try:
+                waveform, duration = load_audio(path, quality=quality, max_samples=nb_samp,
+                                                with_duration=True)
+                if waveform.shape[0] == 0:
+                    raise ValueError("no audio samples")
+            except Exception as e:
+                on_error(path, e)
+                continue
+            loaded.append((path, waveform, duration))
+        try:
+            results = _score_loaded(loaded)
+        except Exception:
+            # find the file that broke the batch, score the rest one by one
+            results = []
+            for entry in loaded:
+                try:
+                    results.extend(_score_loaded([entry]))
+                except Exception as e:
+                    on_error(entry[0], e)
+        yield from results
+
+
+def _score_loaded(loaded) -> List[Dict]:
+    """score_waveforms on (path, waveform, duration) triples"""
+    if not loaded:
+        return []
+    paths, waveforms, durations = zip(*loaded)
+    return score_waveforms(list(paths), list(waveforms), list(durations))
+
+
+def score_or_skip(audio_paths: Iterable[str], on_error, batch_size: int = None,
+                  **kwargs) -> List[Dict]:
+    """
+    score_files that does not stop at a bad file: a file that cannot be
+    decoded or scored is passed to on_error(path, error) and left out.
+    kwargs are passed on to iter_scores.
+    """
+    return list(iter_scores(audio_paths, batch_size, on_error=on_error, **kwargs))
+
+
+def model_versions() -> Dict:
+    """Short identities of the models in use, as output metadata"""
+    return {
+        "aasist_model": registry.identity("AASIST")[:16],
+        "rawnet_model": registry.identity("RawNet")[:16],
+        "backend": registry.get_config("AASIST").get("backend", "eager"),
+    }
+
+
+def set_backend(backend: str = None, compiled_dir: str = None):
+    """
+    Runs both models on "eager", "torchscript" or "onnxruntime" in this
+    process, the compiled ones from the artifacts in compiled_dir. None
+    goes back to the "backend" / "compiled_dir" keys of the config files.
+    """
+    for name in ("AASIST", "RawNet"):
+        registry.set_overrides(name, backend=backend, compiled_dir=compiled_dir)
+
+
+def score_files(audio_paths: List[str], batch_size: int = None, **window_args) -> List[Dict]:
+    """
+    Scores every file with both models, batching the forward passes.
+    window_args are passed on to iter_scores for windowed scoring.
+    returns one result dict per file, in input order
+    """
+    return list(iter_scores(audio_paths, batch_size, **window_args))
@@ -0,0 +1,401 @@
+"""
+Headless command-line scorer.
+
+    python -m spoofdetect score <dir|file|list> [...] --out results.jsonl
+    python -m spoofdetect score <dir> --out results.parquet --resume
+    python -m spoofdetect watch <dir> --out results.csv
+    python -m spoofdetect export --format torchscript onnx
+    python -m spoofdetect profile <files> --trace trace.json
+
+Runs the same AASIST/RawNet scoring as the GUI without importing Qt or
+matplotlib, so it works on machines without a display. A list is a text
+file (.txt, .lst, .scp) with one audio path per line.
+"""
+
+import argparse
+import os
+import sys
+
+from audio_scan import scan_audio
+
+LIST_EXTENSIONS = ('.txt', '.lst', '.scp')
+BACKENDS = ('eager', 'torchscript', 'onnxruntime')
+OUTPUT_FORMATS = ('csv', 'jsonl', 'parquet')
+RESAMPLE_QUALITIES = ('fast', 'high', 'best')
+
+
+def expand_inputs(inputs, **scan_args):
+    """
+    Yields audio paths from files, folders and list files. Folders are
+    scanned lazily, scan_args go to audio_scan.scan_audio.
+    """
+    for item in inputs:
+        if os.path.isdir(item):
+            yield from scan_audio(item, **scan_args)
+        elif item.lower().endswith(LIST_EXTENSIONS):
+            with open(item, 'r') as f_list:
+                for line in f_list:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        yield line
+        else:
+            yield item
+
+
+def _window_args(args):
+    """
+    Converts the windowing options (seconds) to scoring arguments
+    (samples); raises ValueError for a window, hop or top-k the scorer
+    rejects, or a window length the chosen backend cannot take
+    """
+    if args.top_k < 1:
+        raise ValueError('--top-k must be at least 1, got {}'.format(args.top_k))
+    from audio_frontend import SAMPLE_RATE
+    window_args = {}
+    if args.window is not None:
+        window_args['window'] = int(args.window * SAMPLE_RATE)
+    if args.hop is not None:
+        window_args['hop'] = int(args.hop * SAMPLE_RATE)
+    if window_args:
+        from scoring import check_window_backend, window_lengths
+        window_lengths(window_args.get('window'), window_args.get('hop'))
+        check_window_backend(window_args.get('window'), args.backend)
+    if args.aggregate is not None:
+        window_args['aggregate'] = args.aggregate
+        window_args['top_k'] = args.top_k
+    return window_args
+
+
+def _scan_args(args):
+    return {
+        'recursive': not args.no_recursive,
+        'max_depth': args.max_depth,
+        'include': args.include,
+        'exclude': args.exclude,
+    }
+
+
+def _open_cache(args):
+    if args.no_cache:
+        return None
+    from score_cache import ScoreCache
+    return ScoreCache(args.cache)
+
+
+def _stop_on_sigterm():
+    """SIGTERM stops the run like Ctrl+C, so the output file is closed properly"""
+    import signal
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+
+def cmd_score(args):
+    from result_export import open_writer
+    from scoring import model_versions, set_backend
+    window_args = _window_args(args)
+    # also in the parent process: the cache keys follow the backend in use
+    set_backend(args.backend, args.compiled_dir)
+    out = open_writer(args.out, args.format, append=args.append or args.resume,
+                      metadata=model_versions())
+    inputs = expand_inputs(args.inputs, **_scan_args(args))
+    if args.resume:
+        done = out.done_paths()
+        print('resuming, {} files already in {}'.format(len(done), args.out), file=sys.stderr)
+        inputs = (path for path in inputs if path not in done)
+
+    def report(path, error):
+        # a bad file is skipped, the run goes on
+        print('{}: not scored: {}'.format(path, str(error) or type(error).__name__),
+              file=sys.stderr)
+
+    cache = _open_cache(args)
+    _stop_on_sigterm()
+    if args.workers > 1:
+        from parallel_scoring import iter_scores_parallel
+        results = iter_scores_parallel(inputs,
+                                       workers=args.workers,
+                                       threads_per_worker=args.threads,
+                                       batch_size=args.batch_size,
+                                       backend=args.backend,
+                                       compiled_dir=args.compiled_dir,
+                                       cache=cache,
+                                       quality=args.resample_quality,
+                                       on_error=report,
+                                       **window_args)
+    else:
+        import torch
+        from scoring import iter_scores
+        if args.threads:
+            torch.set_num_threads(args.threads)
+        results = iter_scores(inputs, args.batch_size, cache=cache,
+                              quality=args.resample_quality, on_error=report, **window_args)
+
+    interrupted = False
+    try:
+        out.write_many(results)
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        out.close()
+        if cache is not None:
+            cache.close()
+    if interrupted:
+        print('interrupted after {} files, resume with --resume'.format(out.nb_written),
+              file=sys.stderr)
+        return 130
+    print('scored {} files'.format(out.nb_written), file=sys.stderr)
+    return 0
+
+
+def cmd_watch(args):
+    import torch
+    from folder_watch import FolderWatcher
+    from model_registry import registry
+    from result_export import open_writer
+    from scoring import model_versions, score_or_skip, set_backend
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    set_backend(args.backend, args.compiled_dir)
+    window_args = _window_args(args)
+    cache = _open_cache(args)
+    # build both models now, so the first file is scored without delay
+    registry.get("AASIST")
+    registry.get("RawNet")
+
+    watcher = FolderWatcher(args.folder, recursive=args.recursive, settle=args.settle,
+                            poll_interval=args.poll_interval, existing=args.existing,
+                            use_inotify=False if args.poll else None)
+    print('watching {} ({}), Ctrl+C to stop'.format(args.folder, watcher.backend),
+          file=sys.stderr)
+
+    # results are appended, an earlier output file is kept
+    out = open_writer(args.out, args.format, append=True, metadata=model_versions())
+
+    def report(path, error):
+        # a bad file is skipped, the watch goes on
+        print('{}: not scored: {}'.format(path, str(error) or type(error).__name__),
+              file=sys.stderr)
+
+    _stop_on_sigterm()
+    try:
+        for ready in watcher.watch():
+            out.write_many(score_or_skip(ready, report, args.batch_size, cache=cache,
+                                         quality=args.resample_quality, **window_args))
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        out.close()
+        if cache is not None:
+            cache.close()
+    print('scored {} files'.format(out.nb_written), file=sys.stderr)
+    return 0
+
+
+def cmd_profile(args):
+    import numpy as np
+    import torch
+    from audio_frontend import load_audio, prepare_input
+    from model_registry import registry
+    from models.profiling import LayerProfiler
+    import scoring
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    # hooks need the nn.Module graph, not an exported artifact
+    scoring.set_backend('eager')
+    # the same input as score/watch feed the models
+    nb_samp = registry.get_config("AASIST")["model_config"]["nb_samp"]
+    quality = scoring.resample_quality()
+    paths, waveforms = [], []
+    nb_found = 0
+    # files that cannot be decoded are skipped, the scan goes on until the batch is full
+    for path in expand_inputs(args.inputs, **_scan_args(args)):
+        nb_found += 1
+        try:
+            waveform = prepare_input(load_audio(path, quality=quality, max_samples=nb_samp),
+                                     nb_samp)
+        except Exception as e:
+            print('{}: skipped: {}'.format(path, str(e) or type(e).__name__), file=sys.stderr)
+            continue
+        paths.append(path)
+        waveforms.append(waveform)
+        if len(paths) >= args.batch_size:
+            break
+    if not paths:
+        print('no audio files found' if nb_found == 0 else 'no file could be decoded',
+              file=sys.stderr)
+        return 1
+    x_inp = torch.from_numpy(np.stack(waveforms)).to(registry.device)
+
+    profilers = []
+    for name in args.models:
+        model = registry.get(name)
+        with torch.no_grad():
+            # first pass builds caches (filter spectra, board indices) outside the profile
+            model(x_inp)
+            with LayerProfiler(model, depth=args.depth, label=name) as profiler:
+                for _ in range(args.repeats):
+                    model(x_inp)
+        profilers.append(profiler)
+        print('{} on {} file(s), {} pass(es)'.format(name, len(paths), args.repeats))
+        print(profiler.summary())
+        print()
+
+    if args.trace:
+        profilers[0].export_chrome_trace(args.trace, others=profilers[1:])
+        print('trace written to {} (open in https://ui.perfetto.dev)'.format(args.trace),
+              file=sys.stderr)
+    return 0
+
+
+def cmd_export(args):
+    # registers both models with the registry
+    import scoring
+    from model_export import export
+
+    for name in args.models:
+        for fmt, (path, max_diff) in export(name, args.format, args.out_dir).items():
+            print('{} {}: {} (max logit diff vs eager {:.1e})'.format(
+                name, fmt, path, max_diff), file=sys.stderr)
+    return 0
+
+
+def _add_scoring_args(parser):
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='files, or windows with --window, per forward pass (default: from config)')
+    parser.add_argument('--threads', type=int, default=None,
+                        help='torch threads per process')
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help='model runtime; torchscript and onnxruntime load the '
+                             'artifacts written by `export` (default: from config)')
+    parser.add_argument('--compiled-dir', default=None, metavar='DIR',
+                        help='folder the torchscript/onnxruntime backends load artifacts '
+                             'from (default: from config, models/compiled)')
+    parser.add_argument('--resample-quality', choices=RESAMPLE_QUALITIES, default=None,
+                        help='resampler used for files not at 16 kHz; "fast" trades accuracy '
+                             'for speed (default: from config, "high")')
+    parser.add_argument('--cache', default=None, metavar='PATH',
+                        help='score cache file (default: scores.sqlite in the user cache dir)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='score every file again and leave the cache untouched')
+    window = parser.add_argument_group(
+        'windowed scoring',
+        'score the whole recording instead of its first ~4 s; '
+        'setting any of these enables it')
+    window.add_argument('--window', type=float, default=None,
+                        help='window length in seconds (default: model input length)')
+    window.add_argument('--hop', type=float, default=None,
+                        help='hop in seconds (default: half a window)')
+    window.add_argument('--aggregate', choices=('mean', 'max', 'topk'), default=None,
+                        help='how window scores make the file score (default: mean)')
+    window.add_argument('--top-k', type=int, default=3,
+                        help='windows averaged by --aggregate topk')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='spoofdetect',
+        description='Spoofed speech detection with AASIST and RawNet')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    score = subparsers.add_parser(
+        'score', help='score audio files and write one CSV, JSONL or Parquet row per file')
+    score.add_argument('inputs', nargs='+',
+                       help='audio files, folders or list files')
+    score.add_argument('--out', default='-',
+                       help='output file; .csv, .jsonl or .parquet picks the format '
+                            '(default: JSONL on stdout)')
+    score.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                       help='output format, overriding the --out extension')
+    score.add_argument('--append', action='store_true',
+                       help='add to an existing output file instead of replacing it')
+    score.add_argument('--resume', action='store_true',
+                       help='append, skipping files already in the output file')
+    score.add_argument('--workers', type=int, default=1,
+                       help='worker processes (default: 1, in-process)')
+    scan = score.add_argument_group(
+        'folder scanning', 'how folders given as inputs are searched for audio files')
+    scan.add_argument('--no-recursive', action='store_true',
+                      help='only take the files directly inside each folder')
+    scan.add_argument('--max-depth', type=int, default=None,
+                      help='sub-folder levels to descend (default: no limit)')
+    scan.add_argument('--include', action='append', default=None, metavar='PATTERN',
+                      help='only score files matching this glob, e.g. "*/2024-*/*" (repeatable)')
+    scan.add_argument('--exclude', action='append', default=None, metavar='PATTERN',
+                      help='skip files and folders matching this glob, e.g. "*.bak" (repeatable)')
+    _add_scoring_args(score)
+    score.set_defaults(func=cmd_score)
+
+    watch = subparsers.add_parser(
+        'watch', help='score audio files as they land in a folder, until Ctrl+C')
+    watch.add_argument('folder', help='folder to watch')
+    watch.add_argument('--out', default='-',
+                       help='file the results are appended to; .csv, .jsonl or .parquet '
+                            'picks the format (default: JSONL on stdout)')
+    watch.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                       help='output format, overriding the --out extension')
+    watch.add_argument('--recursive', action='store_true',
+                       help='also watch sub-folders')
+    watch.add_argument('--existing', action='store_true',
+                       help='also score the files already in the folder')
+    watch.add_argument('--settle', type=float, default=1.0,
+                       help='seconds a file must stay unchanged before it is scored')
+    watch.add_argument('--poll', action='store_true',
+                       help='rescan instead of inotify (e.g. shares written from other hosts)')
+    watch.add_argument('--poll-interval', type=float, default=1.0,
+                       help='seconds between rescans when polling')
+    _add_scoring_args(watch)
+    watch.set_defaults(func=cmd_watch)
+
+    profile = subparsers.add_parser(
+        'profile', help='time every layer of the models on a batch of files')
+    profile.add_argument('inputs', nargs='+',
+                         help='audio files, folders or list files')
+    profile.add_argument('--models', nargs='+', choices=('AASIST', 'RawNet'),
+                         default=['AASIST', 'RawNet'])
+    profile.add_argument('--batch-size', type=int, default=8,
+                         help='files in the profiled batch (the first ones that decode)')
+    profile.add_argument('--repeats', type=int, default=3,
+                         help='forward passes to aggregate')
+    profile.add_argument('--depth', type=int, default=2,
+                         help='submodule levels to hook (1 = top-level blocks only)')
+    profile.add_argument('--threads', type=int, default=None,
+                         help='torch threads')
+    profile.add_argument('--trace', default=None, metavar='PATH',
+                         help='also write a Chrome/Perfetto trace JSON')
+    profile.set_defaults(func=cmd_profile, no_recursive=False, max_depth=None,
+                         include=None, exclude=None)
+
+    export = subparsers.add_parser(
+        'export', help='write TorchScript/ONNX artifacts for the compiled backends')
+    export.add_argument('--models', nargs='+', choices=('AASIST', 'RawNet'),
+                        default=['AASIST', 'RawNet'])
+    export.add_argument('--format', nargs='+', choices=('torchscript', 'onnx'),
+                        default=['torchscript', 'onnx'])
+    export.add_argument('--out-dir', default=None,
+                        help='folder to write the artifacts to (default: the configs\' '
+                             '"compiled_dir", models/compiled); score with --compiled-dir '
+                             'to load them from another folder')
+    export.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if hasattr(args, 'top_k'):
+        try:
+            _window_args(args)
+        except ValueError as e:
+            parser.error(str(e))
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())